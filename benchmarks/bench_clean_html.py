@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of the summary cleaning used when building news embeds.
+
+Compares the original three-pass clean_html (clean everything, then cut to 300
+characters) with the current single-pass cleaner that stops once it has enough
+text. Payloads are the summaries and content:encoded bodies of real feeds:
+
+    python benchmarks/bench_clean_html.py                # download the feeds of feeds.json, or the defaults
+    python benchmarks/bench_clean_html.py feed1.xml ...  # use saved feed files
+"""
+import os
+import re
+import sys
+import json
+import timeit
+import argparse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feedparser
+from feed_parsing import truncate_summary
+from feed_sources import DEFAULT_FEEDS, USER_AGENT
+
+DOWNLOAD_TIMEOUT = 30
+
+def legacy_clean_html(text):
+    """clean_html as it was before the single-pass cleaner"""
+    text = re.sub(r'<img[^>]+>', '', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip()
+    return text
+
+def legacy_summary(text):
+    summary = legacy_clean_html(text)
+    if len(summary) > 300:
+        summary = summary[:297] + "..."
+    return summary
+
+def load_feeds(registry_file="feeds.json"):
+    """The enabled feeds of the bot's registry in the current directory, DEFAULT_FEEDS without one"""
+    try:
+        with open(registry_file, 'r') as f:
+            feeds = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return DEFAULT_FEEDS
+    return {feed_name: feed['url'] for feed_name, feed in feeds.items() if feed.get('enabled', True)}
+
+def load_payloads(paths):
+    """Return (source, [html bodies]) pairs from saved feed files or from the live feeds"""
+    if paths:
+        sources = [(os.path.basename(path), open(path, 'rb').read()) for path in paths]
+    else:
+        sources = []
+        for feed_name, feed_url in load_feeds().items():
+            try:
+                request = urllib.request.Request(feed_url, headers={'User-Agent': USER_AGENT})
+                with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+                    sources.append((feed_name, response.read()))
+            except Exception as e:
+                print(f"skipping {feed_name}: {e}", file=sys.stderr)
+
+    payloads = []
+    for source, raw in sources:
+        feed = feedparser.parse(raw)
+        bodies = []
+        for entry in feed.entries:
+            bodies.append(entry.get('summary', ''))
+            bodies.extend(content.get('value', '') for content in entry.get('content', []))
+        payloads.append((source, [body for body in bodies if body]))
+    return payloads
+
+def bench(function, bodies, number):
+    runs = timeit.repeat(lambda: [function(body) for body in bodies], number=number, repeat=5)
+    return min(runs) / (number * len(bodies)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help="saved RSS/Atom files, defaults to downloading the feeds")
+    parser.add_argument('-n', '--number', type=int, default=20, help="iterations per timing run")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.files)
+    if not payloads:
+        print("No payloads to benchmark", file=sys.stderr)
+        return 1
+
+    print(f"{'source':<22}{'bodies':>7}{'avg KB':>9}{'legacy us':>12}{'current us':>12}{'speedup':>9}")
+    all_bodies = []
+    for source, bodies in payloads:
+        if not bodies:
+            continue
+        all_bodies.extend(bodies)
+        avg_kb = sum(len(body) for body in bodies) / len(bodies) / 1024
+        legacy = bench(legacy_summary, bodies, args.number)
+        current = bench(truncate_summary, bodies, args.number)
+        print(f"{source:<22}{len(bodies):>7}{avg_kb:>9.1f}{legacy:>12.1f}{current:>12.1f}{legacy / current:>8.1f}x")
+
+    if all_bodies:
+        legacy = bench(legacy_summary, all_bodies, args.number)
+        current = bench(truncate_summary, all_bodies, args.number)
+        print(f"{'total':<22}{len(all_bodies):>7}{'':>9}{legacy:>12.1f}{current:>12.1f}{legacy / current:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Stand-in Discord transport for offline benchmarks.
+
+FakeChannel records every send and simulates Discord's per-channel send bucket
+(5 messages every 5 seconds) plus an optional global request rate. Like
+discord.py does internally, a send that hits an exhausted bucket is counted as
+a 429 and waits for the bucket to reset before going through.
+"""
+import time
+import asyncio
+
+class FakeTransport:
+    """Shared API latency, global rate limit and counters of every fake channel"""
+    def __init__(self, latency=0.05, global_rate=0, bucket_size=5, bucket_period=5.0):
+        self.latency = latency
+        self.global_rate = global_rate
+        self.bucket_size = bucket_size
+        self.bucket_period = bucket_period
+        self.messages = 0
+        self.embeds = 0
+        self.rate_limited = 0
+        self._global_lock = asyncio.Lock()
+        self._next_global = 0.0
+
+    async def _global_slot(self):
+        if not self.global_rate:
+            return
+        async with self._global_lock:
+            now = time.monotonic()
+            if self._next_global > now:
+                await asyncio.sleep(self._next_global - now)
+            self._next_global = max(now, self._next_global) + 1 / self.global_rate
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, transport):
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"noticias-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.transport = transport
+        self.sent = []
+        self._bucket_reset = 0.0
+        self._bucket_remaining = transport.bucket_size
+
+    async def send(self, content=None, embed=None, embeds=None):
+        transport = self.transport
+        now = time.monotonic()
+        if now >= self._bucket_reset:
+            self._bucket_reset = now + transport.bucket_period
+            self._bucket_remaining = transport.bucket_size
+        if self._bucket_remaining <= 0:
+            transport.rate_limited += 1
+            await asyncio.sleep(self._bucket_reset - now)
+            self._bucket_reset = time.monotonic() + transport.bucket_period
+            self._bucket_remaining = transport.bucket_size
+        self._bucket_remaining -= 1
+
+        await transport._global_slot()
+        if transport.latency:
+            await asyncio.sleep(transport.latency)
+
+        embed_count = len(embeds) if embeds else (1 if embed else 0)
+        transport.messages += 1
+        transport.embeds += embed_count
+        self.sent.append((content, embed_count))
+
+class FakeContext:
+    """Enough of commands.Context to invoke a command callback"""
+    def __init__(self, guild, channel):
+        self.guild = guild
+        self.channel = channel
+
+    async def send(self, content=None, embed=None, embeds=None):
+        await self.channel.send(content=content, embed=embed, embeds=embeds)
@@ -0,0 +1,188 @@
+"""
+Local feed server for offline benchmarks.
+
+Serves one RSS/Atom document per source under /feeds/<slug>.xml. Documents
+are either recorded fixtures (a directory with <slug>.xml files, see
+--record in load_test.py) or synthetic feeds shaped like the real sources:
+RSS 2.0 with content:encoded and media:thumbnail, or Atom. The server honours
+If-None-Match with 304s and can add latency, 429s, 5xx errors and redirects.
+"""
+import os
+import re
+import random
+import asyncio
+import hashlib
+from email.utils import formatdate
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+SHARED_HEADLINE = "Nintendo Direct announced for tomorrow with a focus on Switch 2 games"
+
+# Headlines are drawn from these words so distinct items never look like the same story to dedup
+VOCABULARY = (
+    "zelda mario halo doom fortnite minecraft elden ring starfield cyberpunk witcher pokemon sonic "
+    "tekken fifa madden diablo overwatch valorant destiny fallout skyrim persona metroid kirby "
+    "trailer patch update delay remake remaster sequel expansion season roadmap leak review "
+    "sale bundle console handheld studio layoffs acquisition esports tournament beta demo "
+    "launch release multiplayer campaign crossover collaboration soundtrack director interview"
+).split()
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+def _body_html(size_kb, rng):
+    paragraph = (
+        "<p>The studio confirmed the release window during the showcase &amp; shared new "
+        "details about the campaign, the multiplayer beta and the collector&#8217;s edition. "
+        "<a href=\"https://example.com/more\">Read more</a></p>"
+        "<img src=\"https://example.com/image.jpg\" alt=\"screenshot\" />\n"
+    )
+    repeat = max(1, int(size_kb * 1024 / len(paragraph)))
+    return paragraph * repeat + f"<p>Ref {rng.random()}</p>"
+
+def build_feed(source, entries=20, body_kb=8, generation=0, atom=False, seed=0):
+    """
+    Build a synthetic feed document for a source.
+
+    Args:
+        source: Source name, used in titles and links.
+        entries: Number of items in the document.
+        body_kb: Approximate size of each item's HTML body.
+        generation: Changing it publishes new item IDs, as if the source posted news.
+        atom: Build an Atom feed instead of RSS 2.0.
+    """
+    rng = random.Random(f"{seed}-{source}-{generation}")
+    slug = slugify(source)
+    items = []
+    for index in range(entries):
+        number = generation * entries + index
+        if index == 0:
+            title = SHARED_HEADLINE
+        else:
+            title = ' '.join(rng.sample(VOCABULARY, 7)).capitalize() + f" {number}"
+        link = f"https://{slug}.example.com/news/{number}?utm_source=rss&utm_medium=feed"
+        published = formatdate(1_700_000_000 + number * 600, usegmt=True)
+        summary = f"<p>{escape(title)} &amp; more coverage from {escape(source)}.</p>"
+        body = _body_html(body_kb, rng)
+        if atom:
+            items.append(
+                f"<entry><title>{escape(title)}</title><link href=\"{escape(link)}\"/>"
+                f"<id>tag:{slug}.example.com,2024:{number}</id><updated>{published}</updated>"
+                f"<summary type=\"html\">{escape(summary)}</summary>"
+                f"<content type=\"html\">{escape(body)}</content></entry>"
+            )
+        else:
+            items.append(
+                f"<item><title>{escape(title)}</title><link>{escape(link)}</link>"
+                f"<guid>https://{slug}.example.com/?p={number}</guid><pubDate>{published}</pubDate>"
+                f"<description>{escape(summary)}</description>"
+                f"<content:encoded><![CDATA[{body}]]></content:encoded>"
+                f"<media:thumbnail url=\"https://{slug}.example.com/thumb/{number}.jpg\"/></item>"
+            )
+
+    if atom:
+        return (
+            "<?xml version=\"1.0\" encoding=\"utf-8\"?>"
+            "<feed xmlns=\"http://www.w3.org/2005/Atom\">"
+            f"<title>{escape(source)}</title>{''.join(items)}</feed>"
+        ).encode()
+    return (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+        "<rss version=\"2.0\" xmlns:content=\"http://purl.org/rss/1.0/modules/content/\" "
+        "xmlns:media=\"http://search.yahoo.com/mrss/\"><channel>"
+        f"<title>{escape(source)}</title>{''.join(items)}</channel></rss>"
+    ).encode()
+
+class FeedServer:
+    """
+    aiohttp server with one feed per source.
+
+    Args:
+        sources: Source names to serve.
+        fixtures_dir: Directory with recorded <slug>.xml files, synthetic feeds are used for missing ones.
+        latency: Mean response delay in seconds (uniform between 0.5x and 1.5x).
+        error_429, error_5xx, redirect: Probability of each injected response.
+    """
+    def __init__(self, sources, fixtures_dir=None, entries=20, body_kb=8, latency=0.05,
+                 error_429=0.0, error_5xx=0.0, redirect=0.0, seed=0):
+        self.sources = list(sources)
+        self.fixtures_dir = fixtures_dir
+        self.entries = entries
+        self.body_kb = body_kb
+        self.latency = latency
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.redirect = redirect
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.generation = 0
+        self.documents = {}
+        self.stats = {'requests': 0, 'not_modified': 0, '429': 0, '5xx': 0, 'redirects': 0, 'bytes': 0}
+        self._runner = None
+        self.port = None
+        self.publish()
+
+    def publish(self):
+        """Regenerate the synthetic feeds with new items, as if every source posted news"""
+        self.generation += 1
+        for index, source in enumerate(self.sources):
+            slug = slugify(source)
+            document = None
+            if self.fixtures_dir:
+                path = os.path.join(self.fixtures_dir, f"{slug}.xml")
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        document = f.read()
+            if document is None:
+                document = build_feed(
+                    source, self.entries, self.body_kb, self.generation, atom=index % 3 == 2, seed=self.seed
+                )
+            etag = '"' + hashlib.md5(document).hexdigest() + '"'
+            self.documents[slug] = (document, etag)
+
+    def url_for(self, source):
+        return f"http://127.0.0.1:{self.port}/feeds/{slugify(source)}.xml"
+
+    async def _handle(self, request):
+        self.stats['requests'] += 1
+        slug = request.match_info['slug']
+        if slug not in self.documents:
+            raise web.HTTPNotFound()
+
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+
+        roll = self.rng.random()
+        if roll < self.error_429:
+            self.stats['429'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        roll -= self.error_429
+        if roll < self.error_5xx:
+            self.stats['5xx'] += 1
+            return web.Response(status=self.rng.choice([500, 502, 503]))
+        roll -= self.error_5xx
+        if roll < self.redirect and 'moved' not in request.query:
+            self.stats['redirects'] += 1
+            raise web.HTTPFound(f"/feeds/{slug}.xml?moved=1")
+
+        document, etag = self.documents[slug]
+        if request.headers.get('If-None-Match') == etag:
+            self.stats['not_modified'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        self.stats['bytes'] += len(document)
+        return web.Response(body=document, content_type='application/rss+xml', headers={'ETag': etag})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/feeds/{slug}.xml', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
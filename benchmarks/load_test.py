@@ -0,0 +1,233 @@
+"""
+Offline load test of the fetch and delivery pipeline.
+
+Runs the real fetch, parse, dedup, routing and delivery code of bot.py against
+a local feed server (benchmarks/feed_server.py) and fake Discord channels
+(benchmarks/fake_discord.py), for growing numbers of guilds. Every guild count
+runs in its own process, in a temporary directory, so caches and peak memory
+never leak from one run into the next. Each run measures:
+
+    cold     first cycle: every feed downloaded and parsed, every guild gets news
+    warm     the sources publish new items, conditional GETs return them
+    idle     nothing changed: every feed answers 304 and no guild is messaged
+    manual   $actualizar in one guild while everything is cached
+
+and reports wall time, messages and embeds sent, simulated 429s, the longest
+event loop stall, the peak RSS of the bot and of its parse workers, and how
+long importing bot.py and loading its state took.
+
+    python benchmarks/load_test.py                           # 1, 10, 100, 1000 guilds
+    python benchmarks/load_test.py --guilds 1 5000 --latency 0.02
+    python benchmarks/load_test.py --fixtures recorded/      # recorded feeds instead of synthetic ones
+    python benchmarks/load_test.py --record recorded/        # save the live feeds as fixtures
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from feed_server import FeedServer, slugify
+from fake_discord import FakeTransport, FakeGuild, FakeChannel, FakeContext
+
+PHASES = ('cold', 'warm', 'idle', 'manual')
+
+class LoopStallMonitor:
+    """Longest time the event loop was blocked, sampled every interval"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.max_stall = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.max_stall = max(self.max_stall, loop.time() - started - self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def reset(self):
+        self.max_stall = 0.0
+
+    def stop(self):
+        self._task.cancel()
+
+async def run_scenario(args):
+    """One guild count, in this process. Returns the measurements as a dict"""
+    import bot as kaminari
+
+    kaminari.init_state()
+    logging.getLogger().setLevel(logging.WARNING)
+    server = await FeedServer(
+        kaminari.DEFAULT_FEEDS, fixtures_dir=args.fixtures, entries=args.entries, body_kb=args.body_kb,
+        latency=args.feed_latency, error_429=args.error_429, error_5xx=args.error_5xx, redirect=args.redirect
+    ).start()
+    kaminari.GAMING_FEEDS.clear()
+    kaminari.GAMING_FEEDS.update({name: server.url_for(name) for name in kaminari.DEFAULT_FEEDS})
+
+    transport = FakeTransport(latency=args.latency, global_rate=args.global_rate)
+    destinations = []
+    channels = {}
+    for index in range(args.single):
+        guild = FakeGuild(10_000 + index)
+        channel = FakeChannel(20_000 + index, guild, transport)
+        kaminari.server_config.config[str(guild.id)] = channel.id
+        channels[channel.id] = channel
+        destinations.append((guild, channel))
+    filtered = int(args.single * args.filtered)
+    for guild, _ in destinations[:filtered]:
+        kaminari.server_config.filters[str(guild.id)] = {'include': ['trailer', 'nintendo'], 'exclude': ['beta']}
+    kaminari.filter_router.update(kaminari.server_config.filters)
+    kaminari.get_news_channels = lambda: destinations
+    kaminari.bot.get_channel = channels.get
+
+    # Like on_ready, start the parse workers before the first cycle
+    await asyncio.to_thread(kaminari.start_parse_workers)
+    monitor = LoopStallMonitor()
+    monitor.start()
+    results = {'guilds': args.single, 'import_seconds': kaminari.IMPORT_SECONDS}
+
+    async def measure(phase, work):
+        monitor.reset()
+        before = (transport.messages, transport.embeds, transport.rate_limited, server.stats['requests'])
+        started = time.perf_counter()
+        await work()
+        results[phase] = {
+            'seconds': time.perf_counter() - started,
+            'messages': transport.messages - before[0],
+            'embeds': transport.embeds - before[1],
+            'rate_limited': transport.rate_limited - before[2],
+            'requests': server.stats['requests'] - before[3],
+            'max_stall': monitor.max_stall,
+        }
+
+    async def cycle():
+        await kaminari.feed_scheduler.poll_now()
+        await kaminari.check_feeds()
+
+    async def manual():
+        guild, channel = destinations[0]
+        await kaminari.actualizar.callback(FakeContext(guild, channel))
+
+    await measure('cold', cycle)
+    server.publish()
+    await measure('warm', cycle)
+    await measure('idle', cycle)
+    await measure('manual', manual)
+
+    monitor.stop()
+    await kaminari.close_http_session()
+    # The workers are children of the fork server, not of this process: read their peak RSS before they exit
+    results['workers_peak_rss_mb'] = max(
+        (peak_rss_mb(pid) for pid in getattr(kaminari.get_parse_executor(), '_processes', None) or {}), default=0.0
+    )
+    kaminari.shutdown_parse_executor()
+    await server.stop()
+
+    results['server'] = dict(server.stats)
+    # ru_maxrss is in KiB on Linux
+    results['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+def peak_rss_mb(pid):
+    """Peak RSS of another process, from /proc (Linux only, 0 elsewhere)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def run_isolated(guilds, argv):
+    """Run one guild count in a fresh interpreter and working directory"""
+    with tempfile.TemporaryDirectory(prefix='kaminari-load-') as workdir:
+        # The feed server listens on 127.0.0.1
+        env = dict(os.environ, METRICS_PORT='0', PYTHONPATH=REPO_DIR, ALLOW_PRIVATE_FEEDS='1')
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(guilds)] + argv
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"run with {guilds} guilds failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def record_fixtures(directory):
+    """Download the live DEFAULT_FEEDS into directory, for --fixtures"""
+    sys.path.insert(0, REPO_DIR)
+    import bot as kaminari
+
+    os.makedirs(directory, exist_ok=True)
+    for feed_name, feed_url in kaminari.DEFAULT_FEEDS.items():
+        try:
+            request = urllib.request.Request(feed_url, headers={'User-Agent': kaminari.USER_AGENT})
+            with urllib.request.urlopen(request, timeout=kaminari.FETCH_TIMEOUT) as response:
+                body = response.read()
+        except Exception as e:
+            print(f"skipping {feed_name}: {e}", file=sys.stderr)
+            continue
+        with open(os.path.join(directory, f"{slugify(feed_name)}.xml"), 'wb') as f:
+            f.write(body)
+        print(f"{feed_name}: {len(body) / 1024:.0f} KB")
+
+def print_report(all_results):
+    print(f"{'guilds':>7} {'phase':>7} {'seconds':>9} {'messages':>9} {'embeds':>8} {'429s':>6} "
+          f"{'requests':>9} {'stall ms':>9}")
+    for results in all_results:
+        for phase in PHASES:
+            row = results[phase]
+            print(f"{results['guilds']:>7} {phase:>7} {row['seconds']:>9.2f} {row['messages']:>9} "
+                  f"{row['embeds']:>8} {row['rate_limited']:>6} {row['requests']:>9} {row['max_stall'] * 1000:>9.1f}")
+        print(f"{'':>7} peak RSS {results['peak_rss_mb']:.1f} MB, parse workers {results['workers_peak_rss_mb']:.1f} MB, "
+              f"import {results['import_seconds']:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guilds', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--latency', type=float, default=0.05, help="fake Discord API latency per send, seconds")
+    parser.add_argument('--global-rate', type=float, default=50, help="fake global send limit per second, 0 for none")
+    parser.add_argument('--filtered', type=float, default=0.1, help="fraction of guilds with keyword filters")
+    parser.add_argument('--entries', type=int, default=20, help="items per synthetic feed")
+    parser.add_argument('--body-kb', type=float, default=8, help="HTML body size of each synthetic item")
+    parser.add_argument('--feed-latency', type=float, default=0.05, help="feed server response delay, seconds")
+    parser.add_argument('--error-429', type=float, default=0.0, help="probability of a 429 from the feed server")
+    parser.add_argument('--error-5xx', type=float, default=0.0, help="probability of a 5xx from the feed server")
+    parser.add_argument('--redirect', type=float, default=0.0, help="probability of a redirect from the feed server")
+    parser.add_argument('--fixtures', help="directory with recorded <source>.xml feeds")
+    parser.add_argument('--record', metavar='DIR', help="save the live feeds to DIR and exit")
+    parser.add_argument('--json', action='store_true', help="print the raw results as JSON")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args, _ = parser.parse_known_args()
+
+    if args.record:
+        record_fixtures(args.record)
+        return
+    if args.single is not None:
+        print(json.dumps(asyncio.run(run_scenario(args))))
+        return
+
+    if args.fixtures:
+        args.fixtures = os.path.abspath(args.fixtures)
+    argv = sys.argv[1:]
+    if args.fixtures:
+        argv += ['--fixtures', args.fixtures]
+    all_results = [run_isolated(guilds, argv) for guilds in args.guilds]
+    if args.json:
+        print(json.dumps(all_results, indent=2))
+    else:
+        print_report(all_results)
+
+if __name__ == '__main__':
+    main()
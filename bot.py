@@ -1,346 +1,2670 @@
+import time
+STARTUP_BEGAN = time.perf_counter()  # import-to-ready time is measured from here
+
 import discord
 import os
-import feedparser
+import aiohttp
 import json
 import asyncio
-import time
+import functools
+import multiprocessing
 import random
 import logging
 import hashlib
-import re  # Nueva importación
-from datetime import datetime
+import sqlite3
+import ipaddress
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from urllib.parse import urljoin, urlsplit
 from discord.ext import commands, tasks
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+from dedup import StoryIndex
+from digest import DigestWindow, build_digest, period_bounds
+from feed_parsing import parse_feed
+from feed_sources import DEFAULT_FEEDS, USER_AGENT
+from matching import FilterRouter
+from metrics import Registry, start_metrics_server, monitor_event_loop_lag
+
+logger = logging.getLogger(__name__)
+
+def configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('bot.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+# Discord bot configuration
+intents = discord.Intents.default()
+intents.message_content = True
+intents.guilds = True
+
+# Deployment roles: "all" does everything in one process. With STORAGE_BACKEND=sqlite the work can be
+# split into one "fetcher" process, which polls the feeds into DATABASE_FILE without connecting to Discord,
+# and any number of "shard" processes that deliver the stored news to the guilds of their shards.
+BOT_ROLE = os.getenv('BOT_ROLE', 'all').lower()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None  # total shards of the bot, None for an unsharded bot
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] or None  # shards run by this process, None for all
+
+# The feed list is shared by every guild: only the bot's owner and these user IDs may change it
+BOT_OPERATORS = {int(user_id) for user_id in os.getenv('BOT_OPERATORS', '').split(',') if user_id.strip()}
+
+def owns_guild(guild_id):
+    """Whether this process delivers to the guild: always, unless it runs only some of the shards"""
+    if not SHARD_COUNT or not SHARD_IDS:
+        return True
+    # Discord's shard assignment
+    return (int(guild_id) >> 22) % SHARD_COUNT in SHARD_IDS
+
+class NewsBotMixin:
+    async def close(self):
+        outbox.flush()
+        await close_http_session()
+        shutdown_parse_executor()
+        await super().close()
+
+class NewsBot(NewsBotMixin, commands.Bot):
+    pass
+
+class ShardedNewsBot(NewsBotMixin, commands.AutoShardedBot):
+    pass
+
+if SHARD_COUNT:
+    bot = ShardedNewsBot(command_prefix="$", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = NewsBot(command_prefix="$", intents=intents)
+
+# Enabled feeds ({name: url}), kept up to date in place by feed_registry
+GAMING_FEEDS = {}
+
+UPDATE_INTERVAL = 10800  # 3 hours in seconds, average polling interval per feed
+DELIVERY_INTERVAL = int(os.getenv('DELIVERY_INTERVAL', '600'))  # seconds between deliveries of pending news
+# Per-feed polling: intervals adapt to how often each feed publishes, within these bounds
+MIN_FEED_INTERVAL = 900
+MAX_FEED_INTERVAL = 12 * 3600
+FEED_POLL_BUDGET = float(os.getenv('FEED_POLL_BUDGET', '0')) or None  # polls per hour, None keeps UPDATE_INTERVAL's volume
+FEED_START_SPREAD = 600  # first polls after startup are spread over this many seconds
+FEED_RATE_SMOOTHING = 0.3  # weight of the newest observation in the publish rate average
+FEED_ERROR_BACKOFF = 300  # first retry delay after a failed poll, doubles up to MAX_FEED_INTERVAL
+MAX_RETRIES = 3
+MAX_RETRY_DELAY = 30  # longest in-place wait between retries of one fetch
+FEED_FETCH_DEADLINE = 90  # a fetch gives up after this many seconds, retries included
+MAX_REDIRECTS = 5
+CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failed fetches that open a feed's circuit
+CIRCUIT_PROBE_INTERVAL = 6 * 3600  # an open circuit lets one probe through this often
+CHANNEL_RATE_LIMIT = 5  # messages per channel...
+CHANNEL_RATE_PERIOD = 5.0  # ...every this many seconds, Discord's per-channel send bucket
+# "batched" packs up to 10 embeds per message, "individual" sends header, embeds and spacer one by one
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'batched').lower()
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000  # Discord limit for the combined size of all embeds in a message
+DELIVERY_CONCURRENCY = int(os.getenv('DELIVERY_CONCURRENCY', '20'))  # messages in flight across all channels
+DELIVERY_JOB_TIMEOUT = 900  # seconds a single channel delivery may take before it is abandoned
+MAX_ENTRIES_PER_FEED = 5  # newest entries considered on every fetch
+
+DEDUP_WINDOW = int(os.getenv('DEDUP_WINDOW', str(24 * 3600)))  # seconds a story is remembered to collapse duplicates across feeds
+
+# Digest mode: guilds can get one summary post per interval instead of every item
+DIGEST_WINDOW = 24 * 3600  # seconds of fetched items kept for digests, also the longest interval
+DEFAULT_DIGEST_HOURS = 6
+DIGEST_MAX_ITEMS = 25  # items listed in a digest, the rest only count in its totals
+DIGEST_EMBED_CHARS = 3000  # a digest is split into embeds of about this size
+DIGEST_CACHE_SIZE = 64  # built digests kept, one per period and set of filters
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # 0 disables the metrics endpoint
+
+# Feed parsing runs in this many worker processes, 0 parses in a thread of the bot process instead
+PARSE_PROCESSES = int(os.getenv('PARSE_PROCESSES', str(min(4, os.cpu_count() or 1))))
+
+# HTTP client settings for feed fetching
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '6'))  # feeds downloaded at the same time
+FETCH_TIMEOUT = 30  # seconds per request
+HTTP_CONNECTION_LIMIT = 20
+HTTP_LIMIT_PER_HOST = 2
+HTTP_KEEPALIVE_TIMEOUT = 60
+# Feeds on loopback, private or link-local addresses are refused unless this is set (local testing only)
+ALLOW_PRIVATE_FEEDS = os.getenv('ALLOW_PRIVATE_FEEDS', '').lower() in ('1', 'true', 'yes')
+
+# Seen-entry cache settings
+NEWS_CACHE_CAPACITY = int(os.getenv('NEWS_CACHE_CAPACITY', '500'))  # IDs remembered per feed
+NEWS_CACHE_TTL = int(os.getenv('NEWS_CACHE_TTL', '0')) or None  # seconds, None keeps IDs until evicted by capacity
+
+# Storage backend: "json" keeps the original files, "sqlite" stores everything in DATABASE_FILE
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()
+DATABASE_FILE = os.getenv('DATABASE_FILE', 'kaminari.db')
+DELIVERY_HISTORY_TTL = 30 * 24 * 3600  # delivery records older than this are pruned
+NEWS_RETENTION = 7 * 24 * 3600  # fetcher/shard roles: published items kept in the store for shards that fall behind
+FETCHER_LOOP_INTERVAL = 5  # fetcher role: seconds between publishing polled news and reading shard requests
+
+# Outbox: acknowledgements of sent items are written in batches of this many, or this often. A crash
+# repeats at most the messages of the last unwritten batch, 0 writes every acknowledgement right away
+OUTBOX_ACK_BATCH = 200
+OUTBOX_FLUSH_INTERVAL = float(os.getenv('OUTBOX_FLUSH_INTERVAL', '1.0'))
+OUTBOX_MAX_AGE = 2 * 24 * 3600  # items a guild could not receive for this long are dropped
+OUTBOX_JOURNAL_LIMIT = 100000  # json backend: journal lines before the outbox file is rewritten
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and rename it over the target, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class SQLiteStore:
+    """
+    SQLite storage engine for guild channels, seen entries, delivery history and feed metadata.
+
+    The database runs in WAL mode so reads never wait for the periodic write
+    batches, and every batch is written inside a single transaction.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guild_channels (
+            guild_id TEXT PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            last_update TEXT
+        );
+        CREATE TABLE IF NOT EXISTS seen_entries (
+            feed_name TEXT NOT NULL,
+            entry_id TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (feed_name, entry_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_seen_entries_feed_seen ON seen_entries (feed_name, seen_at);
+        CREATE TABLE IF NOT EXISTS deliveries (
+            guild_id TEXT NOT NULL,
+            feed_name TEXT NOT NULL,
+            entry_url TEXT NOT NULL,
+            delivered_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_deliveries_guild ON deliveries (guild_id, delivered_at);
+        CREATE INDEX IF NOT EXISTS idx_deliveries_delivered ON deliveries (delivered_at);
+        CREATE INDEX IF NOT EXISTS idx_deliveries_entry ON deliveries (entry_url);
+        CREATE TABLE IF NOT EXISTS feed_meta (
+            feed_name TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            entries TEXT,
+            updated_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS guild_filters (
+            guild_id TEXT PRIMARY KEY,
+            filters TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS feeds (
+            feed_name TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS news_items (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            feed_name TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            item TEXT NOT NULL,
+            published_at REAL NOT NULL,
+            UNIQUE (feed_name, item_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_news_items_published ON news_items (published_at);
+        CREATE TABLE IF NOT EXISTS guild_cursors (
+            guild_id TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS fetcher_requests (
+            request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL,
+            argument TEXT
+        );
+        CREATE TABLE IF NOT EXISTS outbox_items (
+            feed_name TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            item TEXT NOT NULL,
+            PRIMARY KEY (feed_name, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS outbox (
+            guild_id TEXT NOT NULL,
+            feed_name TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            queued_at REAL NOT NULL,
+            PRIMARY KEY (guild_id, feed_name, item_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_outbox_item ON outbox (feed_name, item_id);
+    """
+
+    def __init__(self, db_file=DATABASE_FILE):
+        self.db_file = db_file
+        # Several processes share the database in the fetcher/shard roles, wait for their writes instead of failing
+        self.conn = sqlite3.connect(db_file, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT INTO store_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def migrate_json(self, config_file="server_config.json", cache_file="news_cache.json", feed_state_file="feed_state.json",
+                     filters_file="server_filters.json", registry_file="feeds.json"):
+        """Import the JSON files used by the json backend, only once per database"""
+        if self._get_meta('json_migrated'):
+            return
+
+        def load(path):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return {}
+
+        now = time.time()
+        config = load(config_file)
+        seen = load(cache_file)
+        feed_state = load(feed_state_file)
+        filters = load(filters_file)
+        feeds = load(registry_file)
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO guild_channels (guild_id, channel_id) VALUES (?, ?)",
+                [(guild_id, channel_id) for guild_id, channel_id in config.items()]
+            )
+            for feed_name, entries in seen.items():
+                if isinstance(entries, list):
+                    entries = {entry_id: now for entry_id in entries}
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO seen_entries (feed_name, entry_id, seen_at) VALUES (?, ?, ?)",
+                    [(feed_name, entry_id, seen_at) for entry_id, seen_at in entries.items()]
+                )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO feed_meta (feed_name, etag, last_modified, entries, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (feed_name, state.get('etag'), state.get('last_modified'), json.dumps(state.get('entries', [])), now)
+                    for feed_name, state in feed_state.items()
+                ]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO guild_filters (guild_id, filters) VALUES (?, ?)",
+                [(guild_id, json.dumps(guild_filters)) for guild_id, guild_filters in filters.items()]
+            )
+            if feeds:
+                self.save_feeds(feeds)
+            self._set_meta('json_migrated', str(now))
+        logger.info(f"Migrated {len(config)} guilds, {len(seen)} seen-entry feeds and {len(feed_state)} feed states into {self.db_file}")
+
+    # Guild channels
+
+    def load_guild_channels(self):
+        rows = self.conn.execute("SELECT guild_id, channel_id, last_update FROM guild_channels").fetchall()
+        channels = {guild_id: channel_id for guild_id, channel_id, _ in rows}
+        last_updates = {guild_id: datetime.fromisoformat(last_update) for guild_id, _, last_update in rows if last_update}
+        return channels, last_updates
+
+    def set_guild_channel(self, guild_id, channel_id):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO guild_channels (guild_id, channel_id) VALUES (?, ?) "
+                "ON CONFLICT(guild_id) DO UPDATE SET channel_id = excluded.channel_id",
+                (guild_id, channel_id)
+            )
+
+    def remove_guild(self, guild_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM guild_channels WHERE guild_id = ?", (guild_id,))
+
+    def set_last_updates(self, last_updates):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE guild_channels SET last_update = ? WHERE guild_id = ?",
+                [(value.isoformat(), guild_id) for guild_id, value in last_updates.items()]
+            )
+
+    def load_guild_filters(self):
+        return {
+            guild_id: json.loads(filters)
+            for guild_id, filters in self.conn.execute("SELECT guild_id, filters FROM guild_filters")
+        }
+
+    def set_guild_filters(self, guild_id, filters):
+        with self.conn:
+            if filters:
+                self.conn.execute(
+                    "INSERT INTO guild_filters (guild_id, filters) VALUES (?, ?) "
+                    "ON CONFLICT(guild_id) DO UPDATE SET filters = excluded.filters",
+                    (guild_id, json.dumps(filters))
+                )
+            else:
+                self.conn.execute("DELETE FROM guild_filters WHERE guild_id = ?", (guild_id,))
+
+    # Feed registry
+
+    def load_feeds(self):
+        """The registry, or None if it was never saved"""
+        feeds = {
+            feed_name: {'url': url, 'enabled': bool(enabled)}
+            for feed_name, url, enabled in self.conn.execute(
+                "SELECT feed_name, url, enabled FROM feeds ORDER BY position"
+            )
+        }
+        # An empty table is also what an operator who removed every feed leaves behind
+        if not feeds and not self._get_meta('feeds_saved'):
+            return None
+        return feeds
+
+    def save_feeds(self, feeds):
+        """Replace the registry, feeds is {name: {'url': ..., 'enabled': ...}} in display order"""
+        with self.conn:
+            self.conn.execute("DELETE FROM feeds")
+            self.conn.executemany(
+                "INSERT INTO feeds (feed_name, url, enabled, position) VALUES (?, ?, ?, ?)",
+                [
+                    (feed_name, feed['url'], int(feed.get('enabled', True)), position)
+                    for position, (feed_name, feed) in enumerate(feeds.items())
+                ]
+            )
+            self._set_meta('feeds_saved', '1')
+
+    # Seen entries
+
+    def load_seen_entries(self):
+        seen = {}
+        for feed_name, entry_id, seen_at in self.conn.execute(
+            "SELECT feed_name, entry_id, seen_at FROM seen_entries ORDER BY feed_name, seen_at"
+        ):
+            seen.setdefault(feed_name, OrderedDict())[entry_id] = seen_at
+        return seen
+
+    def save_seen_entries(self, upserts, deletes):
+        """Apply a batch of seen-entry changes: upserts maps (feed, id) -> seen_at, deletes is a set of (feed, id)"""
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM seen_entries WHERE feed_name = ? AND entry_id = ?",
+                list(deletes)
+            )
+            self.conn.executemany(
+                "INSERT INTO seen_entries (feed_name, entry_id, seen_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(feed_name, entry_id) DO UPDATE SET seen_at = excluded.seen_at",
+                [(feed_name, entry_id, seen_at) for (feed_name, entry_id), seen_at in upserts.items()]
+            )
+
+    def clear_seen_entries(self, feed_name=None):
+        with self.conn:
+            if feed_name:
+                self.conn.execute("DELETE FROM seen_entries WHERE feed_name = ?", (feed_name,))
+            else:
+                self.conn.execute("DELETE FROM seen_entries")
+
+    # Delivery history
+
+    def record_deliveries(self, guild_id, deliveries):
+        """Store (feed_name, entry_url) pairs delivered to a guild"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO deliveries (guild_id, feed_name, entry_url, delivered_at) VALUES (?, ?, ?, ?)",
+                [(str(guild_id), feed_name, entry_url, now) for feed_name, entry_url in deliveries]
+            )
+
+    def delivered_entries(self, entry_urls):
+        """Return the (guild_id, feed_name, entry_url) deliveries on record for these entry URLs"""
+        urls = list(set(entry_urls))
+        delivered = set()
+        # Stay below SQLite's limit of bound parameters per statement
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            delivered.update(self.conn.execute(
+                f"SELECT guild_id, feed_name, entry_url FROM deliveries WHERE entry_url IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ))
+        return delivered
+
+    def prune_deliveries(self, max_age=DELIVERY_HISTORY_TTL):
+        with self.conn:
+            self.conn.execute("DELETE FROM deliveries WHERE delivered_at < ?", (time.time() - max_age,))
+
+    # Feed metadata
+
+    def load_feed_state(self):
+        state = {}
+        for feed_name, etag, last_modified, entries in self.conn.execute(
+            "SELECT feed_name, etag, last_modified, entries FROM feed_meta"
+        ):
+            state[feed_name] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'entries': json.loads(entries) if entries else []
+            }
+        return state
+
+    def save_feed_state(self, state):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO feed_meta (feed_name, etag, last_modified, entries, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(feed_name) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified, "
+                "entries = excluded.entries, updated_at = excluded.updated_at",
+                [
+                    (feed_name, feed_state.get('etag'), feed_state.get('last_modified'), json.dumps(feed_state.get('entries', [])), now)
+                    for feed_name, feed_state in state.items()
+                ]
+            )
+
+    def load_runtime_state(self, key):
+        value = self._get_meta(key)
+        return json.loads(value) if value else {}
+
+    def save_runtime_state(self, key, state):
+        with self.conn:
+            self._set_meta(key, json.dumps(state))
+
+    # Shared news, written by the fetcher role and read by the shards
+
+    def publish_news(self, items):
+        """Append item records, items already published are ignored. Returns how many were added"""
+        now = time.time()
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO news_items (feed_name, item_id, item, published_at) VALUES (?, ?, ?, ?)",
+                [(item['feed_name'], item['id'], json.dumps(item), now) for item in items]
+            )
+            return self.conn.total_changes - before
+
+    def latest_news_seq(self):
+        row = self.conn.execute("SELECT MAX(seq) FROM news_items").fetchone()
+        return row[0] or 0
+
+    def load_news(self, after_seq, up_to_seq):
+        """Return (seq, item record) pairs published after after_seq, up to up_to_seq included"""
+        return [
+            (seq, json.loads(item)) for seq, item in self.conn.execute(
+                "SELECT seq, item FROM news_items WHERE seq > ? AND seq <= ? ORDER BY seq", (after_seq, up_to_seq)
+            )
+        ]
+
+    def load_news_between(self, start, end):
+        """Return (published_at, item record) pairs published in [start, end), for digests"""
+        return [
+            (published_at, json.loads(item)) for published_at, item in self.conn.execute(
+                "SELECT published_at, item FROM news_items WHERE published_at >= ? AND published_at < ? ORDER BY seq",
+                (start, end)
+            )
+        ]
+
+    def prune_news(self, max_age=NEWS_RETENTION):
+        with self.conn:
+            self.conn.execute("DELETE FROM news_items WHERE published_at < ?", (time.time() - max_age,))
+
+    def load_guild_cursors(self):
+        """{guild_id: seq of the last shared item handled for that guild}"""
+        return dict(self.conn.execute("SELECT guild_id, last_seq FROM guild_cursors"))
+
+    def _upsert_guild_cursors(self, cursors):
+        self.conn.executemany(
+            "INSERT INTO guild_cursors (guild_id, last_seq) VALUES (?, ?) "
+            "ON CONFLICT(guild_id) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq)",
+            list(cursors.items())
+        )
+
+    def set_guild_cursors(self, cursors):
+        with self.conn:
+            self._upsert_guild_cursors(cursors)
+
+    def request_fetcher(self, action, argument=None):
+        """Queue an action for the fetcher process: 'poll', 'clear_cache' or 'reload_feeds'"""
+        with self.conn:
+            self.conn.execute("INSERT INTO fetcher_requests (action, argument) VALUES (?, ?)", (action, argument))
+
+    def take_fetcher_requests(self):
+        with self.conn:
+            rows = self.conn.execute("SELECT request_id, action, argument FROM fetcher_requests ORDER BY request_id").fetchall()
+            if rows:
+                self.conn.execute("DELETE FROM fetcher_requests WHERE request_id <= ?", (rows[-1][0],))
+        return [(action, argument) for _, action, argument in rows]
+
+    # Outbox
+
+    def load_outbox(self):
+        """Return (item records, [(guild_id, feed_name, item_id, queued_at)] in queue order)"""
+        records = [json.loads(item) for (item,) in self.conn.execute("SELECT item FROM outbox_items")]
+        pairs = self.conn.execute(
+            "SELECT guild_id, feed_name, item_id, queued_at FROM outbox ORDER BY rowid"
+        ).fetchall()
+        return records, pairs
+
+    def enqueue_outbox(self, records, pairs, cursors=None):
+        """Add item records and (guild_id, feed_name, item_id, queued_at) rows, and move guild cursors, in one transaction"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO outbox_items (feed_name, item_id, item) VALUES (?, ?, ?)",
+                [(record['feed_name'], record['id'], json.dumps(record)) for record in records]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO outbox (guild_id, feed_name, item_id, queued_at) VALUES (?, ?, ?, ?)",
+                pairs
+            )
+            if cursors:
+                self._upsert_guild_cursors(cursors)
+
+    def ack_outbox(self, pairs, orphans):
+        """
+        Delete acknowledged (guild_id, feed_name, item_id) rows, and the (feed_name, item_id)
+        items this process no longer needs unless a guild of another shard still waits for them
+        """
+        with self.conn:
+            self.conn.executemany("DELETE FROM outbox WHERE guild_id = ? AND feed_name = ? AND item_id = ?", pairs)
+            self.conn.executemany(
+                "DELETE FROM outbox_items WHERE feed_name = ? AND item_id = ? AND NOT EXISTS ("
+                "SELECT 1 FROM outbox WHERE outbox.feed_name = outbox_items.feed_name AND outbox.item_id = outbox_items.item_id)",
+                orphans
+            )
+
+class ServerConfig:
+    def __init__(self, config_file="server_config.json", store=None, filters_file="server_filters.json"):
+        self.config_file = config_file
+        self.filters_file = filters_file
+        self.store = store
+        self.last_updates = {}
+        self._pending_updates = {}
+        self.config = self._load_config()
+        self.filters = self._load_filters()
+        # Bumped on every filter change so the shared matcher knows when to rebuild
+        self.filters_version = 0
+
+    def _load_config(self):
+        if self.store:
+            config, self.last_updates = self.store.load_guild_channels()
+            return config
+
+        try:
+            with open(self.config_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            logger.warning(f"Configuration file {self.config_file} not found or invalid. Creating new config.")
+            return {}
+
+    def _save_config(self):
+        try:
+            write_json_atomic(self.config_file, self.config)
+        except Exception as e:
+            logger.error(f"Error saving config: {str(e)}")
+
+    def _load_filters(self):
+        if self.store:
+            return self.store.load_guild_filters()
+
+        try:
+            with open(self.filters_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_filters(self, guild_id):
+        try:
+            if self.store:
+                self.store.set_guild_filters(guild_id, self.filters.get(guild_id))
+            else:
+                write_json_atomic(self.filters_file, self.filters)
+        except Exception as e:
+            logger.error(f"Error saving filters: {str(e)}")
+
+    def set_news_channel(self, guild_id, channel_id):
+        self.config[str(guild_id)] = channel_id
+        if self.store:
+            self.store.set_guild_channel(str(guild_id), channel_id)
+        else:
+            self._save_config()
+
+    def get_news_channel(self, guild_id):
+        return self.config.get(str(guild_id))
+
+    def remove_server(self, guild_id):
+        if str(guild_id) in self.config:
+            del self.config[str(guild_id)]
+            if self.store:
+                self.store.remove_guild(str(guild_id))
+            else:
+                self._save_config()
+
+    def get_last_update(self, guild_id):
+        return self.last_updates.get(str(guild_id))
+
+    def set_last_update(self, guild_id, time):
+        self.last_updates[str(guild_id)] = time
+        self._pending_updates[str(guild_id)] = time
+
+    def get_filters(self, guild_id):
+        """Return the guild's filters: {'sources': [...], 'include': [...], 'exclude': [...], 'digest': hours}"""
+        return self.filters.get(str(guild_id), {})
+
+    def set_filter(self, guild_id, name, values):
+        """Replace one filter ('sources', 'include' or 'exclude'), an empty list removes it"""
+        guild_filters = dict(self.get_filters(guild_id))
+        if values:
+            guild_filters[name] = values
+        else:
+            guild_filters.pop(name, None)
+
+        if guild_filters:
+            self.filters[str(guild_id)] = guild_filters
+        else:
+            self.filters.pop(str(guild_id), None)
+        self.filters_version += 1
+        self._save_filters(str(guild_id))
+
+    def clear_filters(self, guild_id):
+        """Remove the item filters, the digest setting is kept"""
+        guild_filters = self.get_filters(guild_id)
+        if any(name != 'digest' for name in guild_filters):
+            if 'digest' in guild_filters:
+                self.filters[str(guild_id)] = {'digest': guild_filters['digest']}
+            else:
+                del self.filters[str(guild_id)]
+            self.filters_version += 1
+            self._save_filters(str(guild_id))
+
+    def get_digest_interval(self, guild_id):
+        """Seconds between the guild's digests, None when it receives every item"""
+        hours = self.get_filters(guild_id).get('digest')
+        return int(hours * 3600) if hours else None
+
+    def set_digest_interval(self, guild_id, hours):
+        """Switch the guild to one digest every hours hours, None goes back to every item"""
+        self.set_filter(guild_id, 'digest', hours)
+
+    def save_last_updates(self):
+        """Persist the last update times set since the previous call (sqlite backend only)"""
+        if self.store and self._pending_updates:
+            self.store.set_last_updates(self._pending_updates)
+        self._pending_updates = {}
+
+class NewsCache:
+    """
+    Remembers which entries were already published, per feed.
+
+    Every feed keeps an insertion-ordered set (entry ID -> last time seen), so
+    membership checks are O(1) and the oldest IDs are evicted first once the
+    capacity or the optional TTL is exceeded. Changes are only written to disk
+    when save() is called, once per cycle.
+    """
+    def __init__(self, cache_file="news_cache.json", capacity=NEWS_CACHE_CAPACITY, ttl=NEWS_CACHE_TTL, store=None):
+        self.cache_file = cache_file
+        self.capacity = capacity
+        self.ttl = ttl
+        self.store = store
+        # Loaded on first use, so importing the bot does not wait for the whole history
+        self._cache = None
+        self._dirty = False
+        # Pending changes for the sqlite backend, so only touched rows are written
+        self._upserts = {}
+        self._deletes = set()
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = self._load_cache()
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache):
+        self._cache = cache
+
+    def _load_cache(self):
+        if self.store:
+            return self.store.load_seen_entries()
+
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        now = time.time()
+        cache = {}
+        for feed_name, entries in data.items():
+            # Older versions stored a plain list of IDs
+            if isinstance(entries, list):
+                entries = {entry_id: now for entry_id in entries}
+            cache[feed_name] = OrderedDict(entries)
+        return cache
+
+    def _save_cache(self):
+        try:
+            if self.store:
+                self.store.save_seen_entries(self._upserts, self._deletes)
+                self._upserts = {}
+                self._deletes = set()
+            else:
+                write_json_atomic(self.cache_file, self.cache)
+        except Exception as e:
+            logger.error(f"Error saving cache: {str(e)}")
+
+    def _generate_entry_hash(self, entry):
+        """Generate a unique hash for an entry based on title and date"""
+        hash_content = f"{entry.get('title', '')}{entry.get('published', '')}{entry.get('link', '')}"
+        return hashlib.md5(hash_content.encode()).hexdigest()
+
+    def _evict(self, feed_name, seen, now):
+        evicted = []
+        if self.ttl:
+            while seen and next(iter(seen.values())) < now - self.ttl:
+                evicted.append(seen.popitem(last=False)[0])
+        while len(seen) > self.capacity:
+            evicted.append(seen.popitem(last=False)[0])
+
+        if self.store:
+            for entry_id in evicted:
+                self._upserts.pop((feed_name, entry_id), None)
+                self._deletes.add((feed_name, entry_id))
+
+    def is_new_entry(self, feed_name, entry):
+        entry_id = entry.get('id', '') or entry.get('guid', '') or self._generate_entry_hash(entry)
+        now = time.time()
+        seen = self.cache.setdefault(feed_name, OrderedDict())
+        self._dirty = True
+
+        if self.store:
+            self._upserts[(feed_name, entry_id)] = now
+            self._deletes.discard((feed_name, entry_id))
+
+        if entry_id in seen:
+            # Still listed by the feed, keep it from expiring
+            seen.move_to_end(entry_id)
+            seen[entry_id] = now
+            return False
+
+        seen[entry_id] = now
+        self._evict(feed_name, seen, now)
+        return True
+
+    def save(self):
+        """Persist pending changes, meant to be called once per fetch cycle"""
+        if self._dirty:
+            self._save_cache()
+            self._dirty = False
+
+    def reload(self):
+        """Save pending changes and read the cache again, to pick up entries marked seen by another process"""
+        self.save()
+        self.cache = self._load_cache()
+
+    def clear_cache(self, feed_name=None):
+        if feed_name:
+            if feed_name in self.cache:
+                self.cache[feed_name] = OrderedDict()
+        else:
+            self.cache = {}
+
+        if self.store:
+            self.save()
+            self.store.clear_seen_entries(feed_name)
+        else:
+            self._save_cache()
+            self._dirty = False
+
+class FeedStateCache:
+    """Stores HTTP validators (ETag / Last-Modified) and the last parsed entries of every feed"""
+    def __init__(self, cache_file="feed_state.json", store=None):
+        self.cache_file = cache_file
+        self.store = store
+        # Loaded on first use: the last parsed entries of every feed are only needed once feeds are polled
+        self._state = None
+        self._dirty = set()
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = self._load_state()
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+
+    def _load_state(self):
+        if self.store:
+            state = self.store.load_feed_state()
+        else:
+            try:
+                with open(self.cache_file, 'r') as f:
+                    state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return {}
+
+        # Entries stored before parse_feed produced compact entries can't be reused,
+        # drop them together with their validators so the feed is downloaded again
+        return {
+            feed_name: feed_state for feed_name, feed_state in state.items()
+            if all('image_url' in entry for entry in feed_state.get('entries', []))
+        }
+
+    def _save_state(self):
+        try:
+            if self.store:
+                self.store.save_feed_state({feed_name: self.state[feed_name] for feed_name in self._dirty})
+            else:
+                write_json_atomic(self.cache_file, self.state)
+        except Exception as e:
+            logger.error(f"Error saving feed state: {str(e)}")
+
+    def get_conditional_headers(self, feed_name):
+        """Build the If-None-Match / If-Modified-Since headers for the next request"""
+        feed_state = self.state.get(feed_name, {})
+        headers = {}
+        if feed_state.get('etag'):
+            headers['If-None-Match'] = feed_state['etag']
+        if feed_state.get('last_modified'):
+            headers['If-Modified-Since'] = feed_state['last_modified']
+        return headers
+
+    def get_entries(self, feed_name):
+        return self.state.get(feed_name, {}).get('entries', [])
+
+    def update(self, feed_name, etag, last_modified, entries):
+        self.state[feed_name] = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'entries': entries
+        }
+        self._dirty.add(feed_name)
+
+    def save(self):
+        """Persist the state if anything changed since the last save"""
+        if self._dirty:
+            self._save_state()
+            self._dirty = set()
+
+class FeedRegistry:
+    """
+    The list of sources, editable at runtime.
+
+    Feeds live in feeds.json (or the feeds table with the sqlite backend) and are
+    seeded from DEFAULT_FEEDS on first start. GAMING_FEEDS is updated in place
+    with the enabled feeds after every change, so the scheduler and the commands
+    see the new list without a restart.
+    """
+    def __init__(self, registry_file="feeds.json", store=None, defaults=DEFAULT_FEEDS):
+        self.registry_file = registry_file
+        self.store = store
+        self.defaults = defaults
+        self.feeds = {}
+        self.reload()
+
+    def _load_feeds(self):
+        """The saved registry, None if there is none yet"""
+        if self.store:
+            return self.store.load_feeds()
+
+        try:
+            with open(self.registry_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_feeds(self):
+        try:
+            if self.store:
+                self.store.save_feeds(self.feeds)
+            else:
+                write_json_atomic(self.registry_file, self.feeds)
+        except Exception as e:
+            logger.error(f"Error saving feed registry: {str(e)}")
+
+    def _publish(self):
+        enabled = {feed_name: feed['url'] for feed_name, feed in self.feeds.items() if feed.get('enabled', True)}
+        GAMING_FEEDS.clear()
+        GAMING_FEEDS.update(enabled)
+
+    def reload(self):
+        """Read the registry again from disk, e.g. after editing feeds.json by hand"""
+        feeds = self._load_feeds()
+        # Only seeded on first start, an emptied registry stays empty
+        if feeds is None:
+            feeds = {feed_name: {'url': url, 'enabled': True} for feed_name, url in self.defaults.items()}
+            self.feeds = feeds
+            self._save_feeds()
+        self.feeds = feeds
+        self._publish()
+        return self.feeds
+
+    def find(self, name):
+        """Case-insensitive lookup of a feed name, returns the registered name or None"""
+        return next((feed_name for feed_name in self.feeds if feed_name.lower() == name.lower()), None)
+
+    def add(self, feed_name, url):
+        self.feeds[feed_name] = {'url': url, 'enabled': True}
+        self._save_feeds()
+        self._publish()
+
+    def set_enabled(self, feed_name, enabled):
+        self.feeds[feed_name]['enabled'] = enabled
+        self._save_feeds()
+        self._publish()
+
+    def remove(self, feed_name):
+        del self.feeds[feed_name]
+        self._save_feeds()
+        self._publish()
+
+    def update_url(self, feed_name, url):
+        """Follow a permanent redirect: the feed keeps its name and state under the new URL"""
+        self.feeds[feed_name]['url'] = url
+        self._save_feeds()
+        self._publish()
+
+class FeedHealth:
+    """
+    Circuit breaker for every feed.
+
+    A feed's circuit opens after CIRCUIT_FAILURE_THRESHOLD consecutive failed
+    fetches: from then on fetches of it are skipped without a request, except
+    for one probe every CIRCUIT_PROBE_INTERVAL. A successful probe closes the
+    circuit again, a failed one keeps it open for another interval. A feed that
+    answered 429 with a Retry-After is not fetched again before that time.
+    """
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, probe_interval=CIRCUIT_PROBE_INTERVAL):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.feeds = {}
+
+    def _get(self, feed_name):
+        return self.feeds.setdefault(
+            feed_name, {'state': 'closed', 'failures': 0, 'next_probe': None, 'last_error': None, 'retry_at': None}
+        )
+
+    def allow(self, feed_name):
+        """Whether a fetch of the feed may go out now, the probe of an open circuit included"""
+        health = self._get(feed_name)
+        now = time.monotonic()
+        if health['retry_at'] is not None and now < health['retry_at']:
+            return False
+        if health['state'] == 'closed':
+            return True
+        if now < health['next_probe']:
+            return False
+        # Only this probe goes through; if it never reports back another one is allowed after the deadline
+        health['state'] = 'half_open'
+        health['next_probe'] = now + FEED_FETCH_DEADLINE
+        logger.info(f"Probing {feed_name} after {health['failures']} failed fetches")
+        return True
+
+    def record_success(self, feed_name):
+        health = self._get(feed_name)
+        if health['state'] != 'closed':
+            logger.info(f"{feed_name} is responding again, circuit closed")
+        health.update(state='closed', failures=0, next_probe=None, last_error=None, retry_at=None)
+
+    def record_failure(self, feed_name, error=None, retry_after=None):
+        health = self._get(feed_name)
+        health['failures'] += 1
+        health['last_error'] = error
+        health['retry_at'] = time.monotonic() + retry_after if retry_after else None
+        if health['state'] == 'half_open' or health['failures'] >= self.threshold:
+            if health['state'] == 'closed':
+                logger.warning(f"Circuit opened for {feed_name} after {health['failures']} failed fetches: {error}")
+            health['state'] = 'open'
+            health['next_probe'] = time.monotonic() + self.probe_interval
+
+    def probe_time(self, feed_name):
+        """Monotonic time of the next probe of an open circuit, None when the circuit is closed"""
+        health = self.feeds.get(feed_name)
+        if not health or health['state'] == 'closed':
+            return None
+        return health['next_probe']
+
+    def retry_time(self, feed_name):
+        """Monotonic time before which the feed asked not to be fetched again, None if it did not"""
+        health = self.feeds.get(feed_name)
+        return health['retry_at'] if health else None
+
+    def reset(self, feed_name):
+        """Forget a feed's failures, e.g. after its URL changed or it was re-enabled"""
+        self.feeds.pop(feed_name, None)
+
+class RuntimeState:
+    """
+    Schedule timestamps that survive a restart.
+
+    Holds the feed scheduler's per-feed state and the time of the last
+    delivery, in wall clock time, so a restarted bot continues its schedule
+    instead of polling every feed and posting right away. The digest window
+    and the last digest period posted to each guild are kept here too.
+    """
+    def __init__(self, state_file="runtime_state.json", store=None, key='runtime_state'):
+        self.state_file = state_file
+        self.store = store
+        # Processes sharing the database keep their own state under their own key
+        self.key = key
+        self.values = self._load()
+
+    def _load(self):
+        if self.store:
+            return self.store.load_runtime_state(self.key)
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def save(self, **values):
+        self.values.update(values)
+        try:
+            if self.store:
+                self.store.save_runtime_state(self.key, self.values)
+            else:
+                write_json_atomic(self.state_file, self.values)
+        except Exception as e:
+            logger.error(f"Error saving runtime state: {str(e)}")
+
+# Set by init_state
+store = None
+server_config = None
+news_cache = None
+feed_state_cache = None
+feed_registry = None
+runtime_state = None
+outbox = None
+IMPORT_SECONDS = None
+
+feed_health = FeedHealth()
+
+def init_state():
+    """
+    Open the storage and load the persistent state, once at startup before anything uses it.
+
+    Importing the module only defines things: the parse workers import it too,
+    and must neither touch the bot's files nor hold a copy of its state.
+    """
+    global store, server_config, news_cache, feed_state_cache, feed_registry, runtime_state, outbox, IMPORT_SECONDS
+    if STORAGE_BACKEND == 'sqlite':
+        store = SQLiteStore(DATABASE_FILE)
+        store.migrate_json()
+
+    server_config = ServerConfig(store=store)
+    news_cache = NewsCache(store=store)
+    feed_state_cache = FeedStateCache(store=store)
+    feed_registry = FeedRegistry(store=store)
+    runtime_state = RuntimeState(
+        store=store,
+        key='runtime_state' if BOT_ROLE == 'all' else f"runtime_state_{BOT_ROLE}{''.join(f'_{shard_id}' for shard_id in SHARD_IDS or [])}"
+    )
+    outbox = Outbox(store=store)
+
+    IMPORT_SECONDS = time.perf_counter() - STARTUP_BEGAN
+    STARTUP_SECONDS.set(IMPORT_SECONDS, phase='import')
+
+# Metrics, served on http://METRICS_HOST:METRICS_PORT/metrics
+metrics_registry = Registry()
+FEED_FETCH_SECONDS = metrics_registry.histogram('kaminari_feed_fetch_seconds', "Time to download and parse a feed, retries included", ['feed'])
+FEED_REQUESTS = metrics_registry.counter('kaminari_feed_requests_total', "Feed HTTP requests by result (ok, not_modified, rate_limited, error, timeout)", ['feed', 'result'])
+FEED_BYTES = metrics_registry.counter('kaminari_feed_bytes_downloaded_total', "Feed bytes downloaded", ['feed'])
+FEED_PARSE_SECONDS = metrics_registry.histogram('kaminari_feed_parse_seconds', "Time to parse a downloaded feed", ['feed'])
+ENTRIES_SEEN = metrics_registry.counter('kaminari_entries_seen_total', "Entries checked against the seen cache", ['feed'])
+ENTRIES_NEW = metrics_registry.counter('kaminari_entries_new_total', "Entries that were not seen before", ['feed'])
+NEWS_CACHE_SIZE = metrics_registry.gauge('kaminari_news_cache_entries', "Entry IDs held in the seen cache")
+FEED_POLL_INTERVAL = metrics_registry.gauge('kaminari_feed_poll_interval_seconds', "Current polling interval of each feed", ['feed'])
+FEED_CIRCUIT_OPEN = metrics_registry.gauge('kaminari_feed_circuit_open', "1 while a feed's circuit breaker skips its fetches", ['feed'])
+PENDING_NEWS = metrics_registry.gauge('kaminari_pending_news_items', "Items waiting for the next delivery")
+SEND_SECONDS = metrics_registry.histogram('kaminari_discord_send_seconds', "Time to send one message, rate limit waits included")
+SEND_FAILURES = metrics_registry.counter('kaminari_discord_send_failures_total', "Messages that could not be sent")
+RATE_LIMIT_WAIT = metrics_registry.counter('kaminari_rate_limit_wait_seconds_total', "Time spent waiting on channel rate limits")
+RATE_LIMITED = metrics_registry.counter('kaminari_discord_rate_limited_total', "Sends answered with a 429")
+GUILD_DELIVERY_SECONDS = metrics_registry.histogram('kaminari_guild_delivery_seconds', "Time to deliver one batch to one guild")
+DELIVERY_SPREAD = metrics_registry.gauge('kaminari_delivery_cycle_seconds', "Time from cycle start until the first and last guild were delivered", ['position'])
+DIGESTS_BUILT = metrics_registry.counter('kaminari_digests_built_total', "Digests built, each one is shared by every guild with the same settings")
+CHECK_FEEDS_SECONDS = metrics_registry.histogram('kaminari_check_feeds_seconds', "Duration of a check_feeds delivery cycle")
+STARTUP_SECONDS = metrics_registry.gauge('kaminari_startup_seconds', "Time from process start until imports finished and until ready", ['phase'])
+EVENT_LOOP_LAG = metrics_registry.gauge('kaminari_event_loop_lag_seconds', "Latest measured event loop lag")
+EVENT_LOOP_LAG_HISTOGRAM = metrics_registry.histogram(
+    'kaminari_event_loop_lag_distribution_seconds', "Event loop lag", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+NEWS_CACHE_SIZE.set_function(lambda: sum(len(seen) for seen in news_cache.cache.values()))
+FEED_POLL_INTERVAL.set_function(lambda: {feed_name: state['interval'] for feed_name, state in feed_scheduler.feeds.items()})
+FEED_CIRCUIT_OPEN.set_function(lambda: {
+    feed_name: int(health['state'] != 'closed') for feed_name, health in feed_health.feeds.items()
+})
+PENDING_NEWS.set_function(lambda: sum(len(items) for items in feed_scheduler.pending_news.values()))
+
+_http_session = None
+fetch_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+async def get_http_session():
+    """Return the shared HTTP client, creating it on first use"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_CONNECTION_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ssl=False  # Some sources serve broken certificate chains
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+            headers={'User-Agent': USER_AGENT}
+        )
+    return _http_session
+
+_parse_executor = None
+
+def get_parse_executor():
+    """Return the worker process pool used for parsing, None when PARSE_PROCESSES is 0"""
+    global _parse_executor
+    if PARSE_PROCESSES > 0 and _parse_executor is None:
+        # Workers are forked from a single-threaded fork server, never from the bot process: a fork
+        # of it could inherit a lock held by one of its threads (discord heartbeat, DNS resolvers)
+        context = multiprocessing.get_context('forkserver')
+        # The server imports feed_parsing once, every worker starts with it loaded. Workers still
+        # import this module as their __main__, which only defines things (see init_state)
+        context.set_forkserver_preload(['feed_parsing'])
+        _parse_executor = ProcessPoolExecutor(max_workers=PARSE_PROCESSES, mp_context=context)
+    return _parse_executor
+
+def start_parse_workers():
+    """Start the fork server and a first worker. Blocks until the server imported its modules, run it off the event loop"""
+    executor = get_parse_executor()
+    if executor is not None:
+        executor.submit(int).result()
+
+def shutdown_parse_executor():
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+    _parse_executor = None
+
+async def parse_in_background(feed_name, body, headers):
+    """
+    Parse feed bytes off the event loop.
+
+    feedparser is pure Python and CPU heavy, so it runs in worker processes that
+    only send back the compact entries, never the full feedparser result.
+    """
+    executor = get_parse_executor()
+    if executor is None:
+        with FEED_PARSE_SECONDS.time(feed=feed_name):
+            return await asyncio.to_thread(parse_feed, feed_name, body, headers, MAX_ENTRIES_PER_FEED)
+
+    loop = asyncio.get_running_loop()
+    try:
+        with FEED_PARSE_SECONDS.time(feed=feed_name):
+            return await loop.run_in_executor(executor, parse_feed, feed_name, body, headers, MAX_ENTRIES_PER_FEED)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory), start a fresh pool for the next parse
+        logger.error(f"Parsing worker died while parsing {feed_name}, restarting the pool")
+        shutdown_parse_executor()
+        raise
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+class ChannelRateLimiter:
+    """
+    Fixed window per channel, like Discord's per-channel send bucket: at most
+    rate sends, then none until per seconds after the window opened.
+
+    Discord opens its window when the first request arrives, so ours starts
+    over once the first send of the window has completed (see sent), which is
+    never earlier. discord.py already waits on the X-RateLimit-* headers and
+    retries 429s by itself, this keeps us from running into them at all. A 429
+    that still reaches us closes the channel's window for the Retry-After
+    reported by Discord.
+    """
+    def __init__(self, rate=CHANNEL_RATE_LIMIT, per=CHANNEL_RATE_PERIOD):
+        self.rate = rate
+        self.per = per
+        self.buckets = {}
+
+    def _get_bucket(self, channel_id):
+        if channel_id not in self.buckets:
+            self.buckets[channel_id] = {'remaining': 0, 'reset_at': 0.0, 'anchored': True}
+        return self.buckets[channel_id]
+
+    async def acquire(self, channel_id):
+        """Wait until the channel may send another message, return the time waited"""
+        bucket = self._get_bucket(channel_id)
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= bucket['reset_at']:
+                bucket['remaining'] = self.rate
+                bucket['reset_at'] = now + self.per
+                bucket['anchored'] = False
+            if bucket['remaining'] > 0:
+                bucket['remaining'] -= 1
+                return waited
+            # reset_at may still move while we sleep, so check again
+            delay = bucket['reset_at'] - now
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def sent(self, channel_id):
+        """Start the window over from the completion of its first send"""
+        bucket = self._get_bucket(channel_id)
+        if not bucket['anchored']:
+            bucket['reset_at'] = time.monotonic() + self.per
+            bucket['anchored'] = True
+
+    def penalize(self, channel_id, retry_after):
+        bucket = self._get_bucket(channel_id)
+        bucket['remaining'] = 0
+        bucket['reset_at'] = max(bucket['reset_at'], time.monotonic() + retry_after)
+        bucket['anchored'] = True
+
+rate_limiter = ChannelRateLimiter()
+# Global cap on concurrent sends, waiters are served in FIFO order so channels take turns
+send_semaphore = asyncio.Semaphore(DELIVERY_CONCURRENCY)
+
+def get_retry_after(error):
+    """Read how long Discord asked us to wait from a rate limit error"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    headers = getattr(error.response, 'headers', {}) or {}
+    for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+        try:
+            return float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return CHANNEL_RATE_PERIOD
+
+# Channels whose last send was refused with 403 or 404, see drop_unreachable
+unreachable_channels = set()
+
+async def send_with_rate_limit(channel, content=None, embed=None, embeds=None):
+    """Send messages with rate limiting to avoid Discord API issues"""
+    with SEND_SECONDS.time():
+        sent = await _send_with_rate_limit(channel, content, embed, embeds)
+    if not sent:
+        SEND_FAILURES.inc()
+    return sent
+
+async def _send_with_rate_limit(channel, content, embed, embeds):
+    for attempt in range(2):
+        try:
+            RATE_LIMIT_WAIT.inc(await rate_limiter.acquire(channel.id))
+            async with send_semaphore:
+                try:
+                    if embeds:
+                        await channel.send(content=content, embeds=embeds)
+                    elif embed:
+                        await channel.send(embed=embed)
+                    elif content:
+                        await channel.send(content)
+                finally:
+                    rate_limiter.sent(channel.id)
+            unreachable_channels.discard(channel.id)
+            return True
+        except (discord.Forbidden, discord.NotFound) as e:
+            logger.error(f"Cannot send to channel {channel.id}: {str(e)}")
+            unreachable_channels.add(channel.id)
+            return False
+        except (discord.RateLimited, discord.HTTPException) as e:
+            if isinstance(e, discord.HTTPException) and e.status != 429:
+                logger.error(f"Error sending message: {str(e)}")
+                return False
+            RATE_LIMITED.inc()
+            retry_after = get_retry_after(e)
+            logger.warning(f"Rate limited in channel {channel.id}, waiting {retry_after:.1f}s")
+            rate_limiter.penalize(channel.id, retry_after)
+        except Exception as e:
+            logger.error(f"Error sending message: {str(e)}")
+            return False
+    return False
+
+class DeliveryScheduler:
+    """
+    Runs deliveries with one queue and worker per destination channel.
+
+    Jobs for the same channel run in order, so messages never interleave inside
+    a channel, while different channels progress independently: a slow or
+    forbidden channel only delays its own queue. Workers exit once their queue
+    is empty.
+    """
+    def __init__(self, job_timeout=DELIVERY_JOB_TIMEOUT):
+        self.job_timeout = job_timeout
+        self.queues = {}
+        self.workers = {}
+        self.last_cycle_stats = None
+
+    def submit(self, channel, job):
+        """
+        Queue a delivery job for a channel.
+
+        Args:
+            channel: Destination channel.
+            job: Coroutine function called without arguments when the job runs.
+
+        Returns:
+            asyncio.Future: Resolves to the monotonic completion time, or None if the job failed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.setdefault(channel.id, asyncio.Queue())
+        queue.put_nowait((job, future))
+        if channel.id not in self.workers:
+            self.workers[channel.id] = asyncio.create_task(self._worker(channel, queue))
+        return future
+
+    async def _worker(self, channel, queue):
+        while not queue.empty():
+            job, future = queue.get_nowait()
+            try:
+                with GUILD_DELIVERY_SECONDS.time():
+                    await asyncio.wait_for(job(), timeout=self.job_timeout)
+                future.set_result(time.monotonic())
+            except asyncio.TimeoutError:
+                logger.error(f"Delivery to channel {channel.id} timed out after {self.job_timeout}s")
+                future.set_result(None)
+            except Exception as e:
+                logger.error(f"Error delivering to channel {channel.id}: {type(e).__name__} - {str(e)}")
+                future.set_result(None)
+        # No await between the empty check and here, so no job can be queued in between
+        del self.queues[channel.id]
+        del self.workers[channel.id]
+
+    async def run_cycle(self, jobs):
+        """Submit (channel, job) pairs, wait for all of them and log the delivery latency"""
+        started = time.monotonic()
+        futures = [self.submit(channel, job) for channel, job in jobs]
+        results = await asyncio.gather(*futures)
+        completed = [finished - started for finished in results if finished is not None]
+
+        self.last_cycle_stats = {
+            'channels': len(futures),
+            'delivered': len(completed),
+            'first': min(completed) if completed else None,
+            'last': max(completed) if completed else None
+        }
+        if completed:
+            DELIVERY_SPREAD.set(min(completed), position='first')
+            DELIVERY_SPREAD.set(max(completed), position='last')
+            logger.info(
+                f"Delivered to {len(completed)}/{len(futures)} channels, "
+                f"first after {min(completed):.1f}s, last after {max(completed):.1f}s"
+            )
+        return self.last_cycle_stats
+
+delivery_scheduler = DeliveryScheduler()
+
+def pack_embeds(embeds):
+    """Split embeds into groups that fit in a single Discord message"""
+    groups = []
+    current = []
+    current_size = 0
+    for embed in embeds:
+        size = len(embed)
+        if current and (len(current) >= MAX_EMBEDS_PER_MESSAGE or current_size + size > MAX_EMBED_CHARS_PER_MESSAGE):
+            groups.append(current)
+            current = []
+            current_size = 0
+        current.append(embed)
+        current_size += size
+    if current:
+        groups.append(current)
+    return groups
+
+def format_time(dt):
+    return dt.strftime("%H:%M")
+
+class BlockedAddressError(ValueError):
+    """A feed URL that points at the bot's own host or network"""
+
+async def check_public_url(url):
+    """Raise BlockedAddressError unless the URL's host only resolves to public addresses"""
+    if ALLOW_PRIVATE_FEEDS:
+        return
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise BlockedAddressError(f"Unsupported feed URL {url}")
+    try:
+        addresses = [ipaddress.ip_address(parts.hostname)]
+    except ValueError:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
+        addresses = [ipaddress.ip_address(info[4][0].split('%')[0]) for info in infos]
+    for address in addresses:
+        if not address.is_global or address.is_multicast:
+            raise BlockedAddressError(f"{parts.hostname} resolves to the non-public address {address}")
+
+async def request_feed(feed_url, request_headers=None):
+    """
+    GET a feed, following redirects by hand so the hops can be limited and inspected.
+    Every hop must point at a public address, see check_public_url.
+
+    Returns:
+        tuple: (status, headers, body, final_url, moved_permanently). body is only read
+               for 200 responses, moved_permanently is True when every hop was a 301 or 308.
+    """
+    session = await get_http_session()
+    url = feed_url
+    visited = {url}
+    permanent = True
+    for _ in range(MAX_REDIRECTS + 1):
+        await check_public_url(url)
+        async with fetch_semaphore:
+            async with session.get(url, headers=request_headers, allow_redirects=False) as response:
+                status = response.status
+                headers = {key.lower(): value for key, value in response.headers.items()}
+                body = await response.read() if status == 200 else None
+
+        if status not in (301, 302, 303, 307, 308):
+            return status, headers, body, url, permanent and url != feed_url
+        if 'location' not in headers:
+            raise ValueError(f"Redirect {status} without a Location header")
+        url = urljoin(url, headers['location'])
+        if url in visited:
+            raise ValueError(f"Redirect loop through {url}")
+        visited.add(url)
+        permanent = permanent and status in (301, 308)
+    raise ValueError(f"More than {MAX_REDIRECTS} redirects")
+
+def get_retry_after_header(headers):
+    try:
+        return float(headers.get('retry-after', ''))
+    except ValueError:
+        return None
+
+async def _fetch_with_retries(feed_name, feed_url, max_retries):
+    """Returns (entries, error, retry_after), retry_after being the Retry-After of a final 429"""
+    retry_after = None
+    for attempt in range(max_retries + 1):
+        if attempt > 0:
+            delay = retry_after or (2 ** attempt) + random.randint(0, 1000) / 1000
+            await asyncio.sleep(min(MAX_RETRY_DELAY, delay))
+            retry_after = None
+
+        try:
+            request_headers = feed_state_cache.get_conditional_headers(feed_name)
+            status, headers, body, final_url, moved = await request_feed(feed_url, request_headers)
+
+            if final_url != feed_url:
+                logger.info(f"Redirecting {feed_name} to: {final_url}")
+                if moved and feed_registry.feeds.get(feed_name, {}).get('url') == feed_url:
+                    logger.info(f"{feed_name} moved permanently, updating its URL")
+                    feed_registry.update_url(feed_name, final_url)
+
+            if body is not None:
+                FEED_BYTES.inc(len(body), feed=feed_name)
+
+            if status == 304:
+                # Nothing changed upstream, reuse the entries parsed last time
+                FEED_REQUESTS.inc(feed=feed_name, result='not_modified')
+                logger.info(f"{feed_name} not modified since last fetch")
+                return feed_state_cache.get_entries(feed_name), None, None
+            elif status == 429:
+                FEED_REQUESTS.inc(feed=feed_name, result='rate_limited')
+                retry_after = get_retry_after_header(headers)
+                error = "Status 429"
+                logger.warning(f"Rate limit reached for {feed_name}")
+                if retry_after is not None and retry_after > MAX_RETRY_DELAY:
+                    # Too long to wait in place, the scheduler polls again once it is over
+                    return None, error, retry_after
+                continue
+            elif status != 200:
+                FEED_REQUESTS.inc(feed=feed_name, result='error')
+                logger.error(f"Error fetching {feed_name}: Status {status}")
+                # Client errors will not go away by retrying right now
+                if status < 500:
+                    return None, f"Status {status}", None
+                error = f"Status {status}"
+                continue
+
+            FEED_REQUESTS.inc(feed=feed_name, result='ok')
+            headers['content-location'] = final_url
+            entries = await parse_in_background(feed_name, body, headers)
+            feed_state_cache.update(feed_name, headers.get('etag'), headers.get('last-modified'), entries)
+            return entries, None, None
+
+        except ValueError as e:
+            # Redirect loops and the like, retrying gives the same answer
+            FEED_REQUESTS.inc(feed=feed_name, result='error')
+            logger.error(f"Error processing {feed_name}: {str(e)}")
+            return None, str(e), None
+        except Exception as e:
+            FEED_REQUESTS.inc(feed=feed_name, result='error')
+            logger.error(f"Error processing {feed_name}: {str(e)}")
+            error = f"{type(e).__name__}: {str(e)}"
+
+    if max_retries:
+        logger.error(f"Max retries reached for {feed_name}")
+    return None, error, retry_after
+
+async def fetch_entries(feed_name, feed_url, max_retries=MAX_RETRIES):
+    """Download and parse a feed, return its newest entries or None if it could not be fetched"""
+    if not feed_health.allow(feed_name):
+        logger.info(f"Skipping {feed_name}, its circuit is open or it asked to wait")
+        return None
+
+    with FEED_FETCH_SECONDS.time(feed=feed_name):
+        try:
+            # A slow or dead feed never holds its caller longer than the deadline
+            entries, error, retry_after = await asyncio.wait_for(
+                _fetch_with_retries(feed_name, feed_url, max_retries), FEED_FETCH_DEADLINE
+            )
+        except asyncio.TimeoutError:
+            FEED_REQUESTS.inc(feed=feed_name, result='timeout')
+            logger.error(f"Gave up on {feed_name} after {FEED_FETCH_DEADLINE}s")
+            entries, error, retry_after = None, "Timeout", None
+
+    if entries is None:
+        feed_health.record_failure(feed_name, error, retry_after)
+    else:
+        feed_health.record_success(feed_name)
+    return entries
+
+@dataclass(slots=True)
+class NewsItem:
+    """
+    A news entry ready to publish.
+
+    The fetch stage only produces these, the embed is rendered the first time
+    the item is delivered and that same embed is reused for every channel.
+    """
+    feed_name: str
+    id: str
+    title: str
+    link: str
+    published: str
+    summary: str
+    image_url: str = None
+    # (feed_name, link) of other feeds that published the same story
+    other_sources: list = field(default_factory=list, compare=False)
+    _embed: discord.Embed = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_entry(cls, feed_name, entry):
+        """Build an item from a compact entry as returned by parse_feed"""
+        return cls(
+            feed_name=feed_name,
+            id=entry['id'],
+            title=entry['title'],
+            link=entry['link'],
+            published=entry['published'],
+            summary=entry['summary'],
+            image_url=entry['image_url']
+        )
+
+    def to_record(self):
+        """Plain dict of the item, as stored for the shard processes"""
+        return {
+            'feed_name': self.feed_name,
+            'id': self.id,
+            'title': self.title,
+            'link': self.link,
+            'published': self.published,
+            'summary': self.summary,
+            'image_url': self.image_url,
+            'other_sources': [list(source) for source in self.other_sources]
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        item = cls.from_entry(record['feed_name'], record)
+        item.other_sources = [tuple(source) for source in record.get('other_sources', [])]
+        return item
+
+    def to_embed(self):
+        if self._embed is None:
+            embed = discord.Embed(
+                title=self.title,
+                url=self.link,
+                description=self.summary if self.summary else None,
+                color=discord.Color.blue()
+            )
+            embed.set_footer(text=f"Fuente: {self.feed_name} | Publicado: {self.published}")
+            if self.other_sources:
+                embed.add_field(
+                    name="También en",
+                    value=" · ".join(f"[{feed_name}]({link})" for feed_name, link in self.other_sources)[:1024],
+                    inline=False
+                )
+            if self.image_url:
+                embed.set_thumbnail(url=self.image_url)
+            self._embed = embed
+        return self._embed
+
+class Outbox:
+    """
+    News waiting to be delivered, per guild.
+
+    Every (guild, item) pair is written here before the entries are saved as
+    seen, and acknowledged once the message carrying the item was sent, so a
+    crash or a restart resumes with exactly the pairs that were not sent yet.
+    Acknowledgements are buffered and written in batches of OUTBOX_ACK_BATCH
+    or every OUTBOX_FLUSH_INTERVAL seconds: a crash can only repeat the
+    messages of the last unwritten batch. Only pending work is kept, so
+    loading it at startup stays cheap.
+
+    Without the sqlite store, changes are appended to a journal next to the
+    outbox file, one line per new item, per group of guilds queued the same
+    items and per acknowledgement. The file itself is only rewritten when the
+    outbox is empty or the journal grows past OUTBOX_JOURNAL_LIMIT lines.
+    """
+    def __init__(self, outbox_file="outbox.json", store=None):
+        self.outbox_file = outbox_file
+        self.store = store
+        self.items = {}
+        # guild_id -> {(feed_name, item_id): queued_at}, in queue order
+        self.pending = {}
+        self._refs = {}
+        self._acks = []
+        self._last_flush = time.monotonic()
+        self.journal_file = f"{outbox_file}.journal"
+        self._journal_lines = 0
+        self._load()
+
+    def _load(self):
+        if self.store:
+            records, pairs = self.store.load_outbox()
+        else:
+            try:
+                with open(self.outbox_file, 'r') as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = {}
+            records = data.get('items', [])
+            pairs = [tuple(pair) for pair in data.get('pending', [])]
+            records, pairs = self._replay_journal(records, pairs)
+
+        # The shards share the database, each one only takes the pairs of its own guilds
+        pairs = [pair for pair in pairs if owns_guild(pair[0])]
+        records = {(record['feed_name'], record['id']): record for record in records}
+        missing = 0
+        for guild_id, feed_name, item_id, queued_at in pairs:
+            key = (feed_name, item_id)
+            if key not in records:
+                missing += 1
+                continue
+            if key not in self.items:
+                self.items[key] = NewsItem.from_record(records[key])
+            self._add_pair(guild_id, key, queued_at)
+        if missing:
+            logger.warning(f"Skipped {missing} outbox entries whose item is missing")
+        if pairs:
+            logger.info(f"Resuming {len(pairs) - missing} undelivered items for {len(self.pending)} guilds")
+
+    def _replay_journal(self, records, pairs):
+        """Apply the journal written since the outbox file was saved"""
+        pending = {(guild_id, feed_name, item_id): queued_at for guild_id, feed_name, item_id, queued_at in pairs}
+        try:
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash, nothing after it was written
+                        break
+                    self._journal_lines += 1
+                    if entry[0] == 'i':
+                        records.append(entry[1])
+                    elif entry[0] == '+':
+                        _, queued_at, guild_ids, keys = entry
+                        for guild_id in guild_ids:
+                            for feed_name, item_id in keys:
+                                pending.setdefault((guild_id, feed_name, item_id), queued_at)
+                    elif entry[0] == '-':
+                        pending.pop(tuple(entry[1:]), None)
+        except FileNotFoundError:
+            pass
+        return records, [(*pair, queued_at) for pair, queued_at in pending.items()]
+
+    def _append_journal(self, entries):
+        try:
+            with open(self.journal_file, 'a') as f:
+                f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            self._journal_lines += len(entries)
+        except Exception as e:
+            logger.error(f"Error writing outbox journal: {str(e)}")
+
+    def _compact(self):
+        """Rewrite the outbox file with the pending work and start an empty journal"""
+        self._save_file()
+        try:
+            open(self.journal_file, 'w').close()
+            self._journal_lines = 0
+        except Exception as e:
+            logger.error(f"Error truncating outbox journal: {str(e)}")
+
+    def _save_file(self):
+        try:
+            write_json_atomic(self.outbox_file, {
+                'items': [item.to_record() for item in self.items.values()],
+                'pending': [
+                    [guild_id, feed_name, item_id, queued_at]
+                    for guild_id, queued in self.pending.items()
+                    for (feed_name, item_id), queued_at in queued.items()
+                ]
+            })
+        except Exception as e:
+            logger.error(f"Error saving outbox: {str(e)}")
+
+    def _add_pair(self, guild_id, key, queued_at):
+        queued = self.pending.setdefault(guild_id, {})
+        if key in queued:
+            return False
+        queued[key] = queued_at
+        self._refs[key] = self._refs.get(key, 0) + 1
+        return True
+
+    def _remove_pair(self, guild_id, key):
+        queued = self.pending.get(guild_id)
+        if not queued or queued.pop(key, None) is None:
+            return
+        if not queued:
+            del self.pending[guild_id]
+        self._acks.append((guild_id, key))
+        self._refs[key] -= 1
+
+    def enqueue(self, guild_batches, cursors=None):
+        """
+        Queue {guild_id: batch} and write it at once, together with the shard cursors if given.
+
+        With the sqlite store, items the delivery history says a guild already
+        received are left out, so losing the seen-entry cache does not repost them.
+        """
+        now = time.time()
+        new_items = []
+        pairs = []
+        delivered = set()
+        if self.store:
+            delivered = self.store.delivered_entries(
+                item.link for batch in guild_batches.values() for items in batch.values() for item in items
+            )
+        skipped = 0
+        for guild_id, batch in guild_batches.items():
+            guild_id = str(guild_id)
+            for items in batch.values():
+                for item in items:
+                    if (guild_id, item.feed_name, item.link) in delivered:
+                        skipped += 1
+                        continue
+                    key = (item.feed_name, item.id)
+                    if key not in self.items:
+                        self.items[key] = item
+                        new_items.append(item)
+                    if self._add_pair(guild_id, key, now):
+                        pairs.append((guild_id, item.feed_name, item.id, now))
+        if skipped:
+            logger.warning(f"Skipped {skipped} items the delivery history shows as already sent")
+
+        if self.store:
+            self.store.enqueue_outbox([item.to_record() for item in new_items], pairs, cursors)
+        elif pairs:
+            # Guilds usually get the same items, each distinct list is written once
+            by_keys = {}
+            keys_by_guild = {}
+            for guild_id, feed_name, item_id, _ in pairs:
+                keys_by_guild.setdefault(guild_id, []).append([feed_name, item_id])
+            for guild_id, keys in keys_by_guild.items():
+                by_keys.setdefault(json.dumps(keys), (keys, []))[1].append(guild_id)
+            self._append_journal(
+                [['i', item.to_record()] for item in new_items] +
+                [['+', now, guild_ids, keys] for keys, guild_ids in by_keys.values()]
+            )
+
+    def has_pending(self, guild_id):
+        return str(guild_id) in self.pending
+
+    def batch_for(self, guild_id):
+        """The guild's unsent items grouped by source, in queue order"""
+        batch = {}
+        for key in self.pending.get(str(guild_id), {}):
+            item = self.items[key]
+            batch.setdefault(item.feed_name, []).append(item)
+        return batch
+
+    def ack(self, guild_id, items):
+        """Mark items as delivered to a guild, written with the next batch of acknowledgements"""
+        for item in items:
+            self._remove_pair(str(guild_id), (item.feed_name, item.id))
+        if len(self._acks) >= OUTBOX_ACK_BATCH or time.monotonic() - self._last_flush >= OUTBOX_FLUSH_INTERVAL:
+            self.flush()
+
+    def remove_guild(self, guild_id):
+        for key in list(self.pending.get(str(guild_id), {})):
+            self._remove_pair(str(guild_id), key)
+        self.flush()
+
+    def expire(self, max_age=OUTBOX_MAX_AGE):
+        """Give up on items a guild could not receive for max_age seconds, e.g. a channel the bot can no longer write to"""
+        cutoff = time.time() - max_age
+        expired = 0
+        for guild_id in list(self.pending):
+            for key, queued_at in list(self.pending[guild_id].items()):
+                if queued_at < cutoff:
+                    self._remove_pair(guild_id, key)
+                    expired += 1
+        if expired:
+            logger.warning(f"Dropped {expired} items that could not be delivered in {max_age / 3600:.0f}h")
+            self.flush()
+
+    def flush(self):
+        """Write the buffered acknowledgements and forget the items no guild waits for"""
+        self._last_flush = time.monotonic()
+        if not self._acks:
+            return
+        orphans = []
+        for _, key in self._acks:
+            if self._refs.get(key) == 0:
+                del self._refs[key]
+                del self.items[key]
+                orphans.append(key)
+        acks, self._acks = self._acks, []
+
+        if self.store:
+            try:
+                self.store.ack_outbox([(guild_id, feed_name, item_id) for guild_id, (feed_name, item_id) in acks], orphans)
+            except Exception as e:
+                logger.error(f"Error saving outbox acknowledgements: {str(e)}")
+        else:
+            self._append_journal([['-', guild_id, feed_name, item_id] for guild_id, (feed_name, item_id) in acks])
+            # Rewriting an empty outbox is free, a busy one only once the journal got long
+            if not self.pending or self._journal_lines >= OUTBOX_JOURNAL_LIMIT:
+                self._compact()
+
+story_index = StoryIndex(window=DEDUP_WINDOW)
+
+def collapse_duplicates(batch):
+    """Merge the same story published by several feeds into one item listing every source"""
+    batch, removed = story_index.collapse(batch)
+    if removed:
+        logger.info(f"Collapsed {removed} duplicate entries across feeds")
+    return batch
+
+filter_router = FilterRouter()
+_filter_router_version = None
+
+def route_batch(batch):
+    """
+    Match a batch against every guild's filters in one pass.
+
+    Returns:
+        dict: {guild_id: batch} for guilds with filters, other guilds get the whole batch.
+    """
+    global _filter_router_version
+    if _filter_router_version != server_config.filters_version:
+        filter_router.update(server_config.filters)
+        _filter_router_version = server_config.filters_version
+    return filter_router.route(batch)
+
+# An hour longer than the longest interval, so a period is still whole when its digest is built
+digest_window = DigestWindow(window=DIGEST_WINDOW + 3600)
+_digests = OrderedDict()
+
+def digest_entries(start, end):
+    """(arrival time, item) pairs of the items fetched in [start, end)"""
+    if BOT_ROLE == 'shard':
+        # The fetcher's store is the shards' window
+        return [
+            (published_at, NewsItem.from_record(record))
+            for published_at, record in store.load_news_between(start, end)
+        ]
+    return digest_window.between(start, end)
+
+def get_digest(start, end, guild_filters):
+    """
+    Embeds of the digest of [start, end) for a guild's filters.
+
+    Built once per period and set of filters, every guild with the same
+    settings gets the same embeds.
+    """
+    item_filters = {name: values for name, values in guild_filters.items() if name != 'digest'}
+    key = (start, end, json.dumps(item_filters, sort_keys=True))
+    if key in _digests:
+        _digests.move_to_end(key)
+        return _digests[key]
+
+    entries = digest_entries(start, end)
+    if item_filters:
+        router = FilterRouter({'guild': item_filters})
+        entries = [
+            (added_at, item) for added_at, item in entries
+            if router.guilds_for_item(item)
+        ]
+    embeds = render_digest(build_digest(entries, now=end, max_items=DIGEST_MAX_ITEMS), start, end)
+    DIGESTS_BUILT.inc()
+
+    _digests[key] = embeds
+    if len(_digests) > DIGEST_CACHE_SIZE:
+        _digests.popitem(last=False)
+    return embeds
+
+def _digest_line(item):
+    title = item.title.replace('[', '(').replace(']', ')')
+    if len(title) > 120:
+        title = title[:117] + "..."
+    line = f"• [{title}]({item.link}) · {item.feed_name}"
+    if item.other_sources:
+        line += f" (+{len(item.other_sources)})"
+    return line
+
+def render_digest(digest, start, end):
+    """Embeds of a digest: totals and the busiest sources, then a field per topic, split in pages"""
+    if not digest['total']:
+        return []
+
+    shown = sum(len(items) for _, items in digest['sections'])
+    description = (
+        f"**{digest['total']}** noticias de **{len(digest['sources'])}** fuentes entre las "
+        f"{format_time(datetime.fromtimestamp(start))} y las {format_time(datetime.fromtimestamp(end))}\n"
+        f"Más activas: {', '.join(f'{name} ({count})' for name, count in digest['sources'].most_common(5))}"
+    )
+    if shown < digest['total']:
+        description += f"\nLas {shown} más destacadas:"
+    embeds = [discord.Embed(title="📰 Resumen de noticias de gaming", description=description, color=discord.Color.gold())]
+
+    for topic, items in digest['sections']:
+        # A field holds at most 1024 characters, long topics continue in another field
+        values = []
+        current = ""
+        for line in (_digest_line(item) for item in items):
+            if current and len(current) + len(line) + 1 > 1024:
+                values.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line[:1024]
+        values.append(current)
+
+        for value in values:
+            embed = embeds[-1]
+            if len(embed.fields) >= 25 or len(embed) + len(topic) + len(value) > DIGEST_EMBED_CHARS:
+                embed = discord.Embed(color=discord.Color.gold())
+                embeds.append(embed)
+            embed.add_field(name=topic, value=value, inline=False)
+    return embeds
+
+def digest_periods():
+    """{guild_id: end of the last digest period posted}, kept with the runtime state"""
+    return runtime_state.values.setdefault('digests', {})
+
+def build_news_items(feed_name, entries):
+    """Return the entries not published yet as NewsItems"""
+    try:
+        news_items = []
+        logger.info(f"Processing {feed_name}: {len(entries)} entries found")
+
+        for entry in entries:
+            if news_cache.is_new_entry(feed_name, entry):
+                logger.info(f"New entry found in {feed_name}")
+                news_items.append(NewsItem.from_entry(feed_name, entry))
+
+        ENTRIES_SEEN.inc(len(entries), feed=feed_name)
+        ENTRIES_NEW.inc(len(news_items), feed=feed_name)
+        return news_items
+    except Exception as e:
+        logger.error(f"Error processing {feed_name}: {str(e)}")
+        return []
+
+async def fetch_feed(feed_name, feed_url, max_retries=MAX_RETRIES):
+    entries = await fetch_entries(feed_name, feed_url, max_retries)
+    if not entries:
+        return []
+    return build_news_items(feed_name, entries)
+
+async def validate_feed(feed_name, feed_url):
+    """
+    Test fetch and parse a feed before adding it to the registry.
+
+    Returns:
+        tuple: (entries, None) when the URL serves a feed with entries, (None, error message) otherwise.
+    """
+    if not (feed_url.startswith('http://') or feed_url.startswith('https://')):
+        return None, "La URL debe empezar con http:// o https://"
+
+    try:
+        status, headers, body, final_url, _ = await request_feed(feed_url)
+        if status != 200:
+            return None, f"El servidor respondió con el estado {status}"
+        headers['content-location'] = final_url
+        entries = await parse_in_background(feed_name, body, headers)
+    except BlockedAddressError:
+        return None, "La URL apunta a una dirección local o privada"
+    except Exception as e:
+        return None, f"No se pudo descargar el feed: {type(e).__name__}"
+
+    if not entries:
+        return None, "La URL no contiene un feed RSS/Atom con entradas"
+    return entries, None
+
+async def fetch_all_feeds():
+    """
+    Fetch every feed once and return the new items grouped by source.
+
+    The caller saves news_cache once the items are safe in the outbox.
+    """
+    # All feeds are requested concurrently, fetch_semaphore caps how many are in flight
+    feeds = list(GAMING_FEEDS.items())
+    results = await asyncio.gather(
+        *(fetch_feed(feed_name, feed_url) for feed_name, feed_url in feeds)
+    )
+
+    batch = {}
+    for (feed_name, _), news_items in zip(feeds, results):
+        if news_items:
+            batch[feed_name] = news_items
+    return batch
+
+async def deliver_news(channel, batch):
+    """
+    Send an already fetched batch of news to a channel.
+
+    Stops at the first send that fails, the rest stays in the outbox. Returns
+    whether everything went through.
+    """
+    if not batch:
+        return await send_with_rate_limit(channel, content="No se encontraron noticias nuevas en esta actualización.")
+
+    if DELIVERY_MODE == 'batched':
+        delivered, complete = await _deliver_batched(channel, batch)
+    else:
+        delivered, complete = await _deliver_individually(channel, batch)
+
+    if store and delivered:
+        store.record_deliveries(channel.guild.id, delivered)
+    return complete
+
+async def _deliver_batched(channel, batch):
+    """Pack the embeds of every source into as few messages as possible, the footer names the source"""
+    items = [item for news_items in batch.values() for item in news_items]
+
+    delivered = []
+    start = 0
+    for group in pack_embeds([item.to_embed() for item in items]):
+        group_items = items[start:start + len(group)]
+        start += len(group)
+        if not await send_with_rate_limit(channel, embeds=group):
+            logger.error(f"Error sending news batch in {channel.guild.name}")
+            return delivered, False
+        outbox.ack(channel.guild.id, group_items)
+        delivered.extend((item.feed_name, item.link) for item in group_items)
+    return delivered, True
+
+async def _deliver_individually(channel, batch):
+    delivered = []
+    for feed_name, news_items in batch.items():
+        try:
+            header = f"▓▓▓▓▓▓▓▓▓▓ Noticias de {feed_name} ▓▓▓▓▓▓▓▓▓▓"
+            sent = await send_with_rate_limit(channel, content=f"**{header}**")
+
+            for item in news_items:
+                sent = sent and await send_with_rate_limit(channel, embed=item.to_embed())
+                if not sent:
+                    break
+                outbox.ack(channel.guild.id, [item])
+                delivered.append((feed_name, item.link))
+
+            if not sent or not await send_with_rate_limit(channel, content="_ _"):
+                logger.error(f"Error sending news from {feed_name} in {channel.guild.name}")
+                return delivered, False
+        except Exception as e:
+            logger.error(f"Error sending news from {feed_name} in {channel.guild.name}: {str(e)}")
+            return delivered, False
+    return delivered, True
+
+def get_news_channels():
+    """Return (guild, channel) pairs for every guild with a configured news channel"""
+    destinations = []
+    for guild in bot.guilds:
+        channel_id = server_config.get_news_channel(guild.id)
+        if not channel_id:
+            continue
+
+        channel = bot.get_channel(channel_id)
+        if not channel:
+            continue
 
-logger = logging.getLogger(__name__)
+        destinations.append((guild, channel))
+    return destinations
+
+async def deliver_pending_news(channel):
+    """Send everything the outbox holds for the channel's guild"""
+    await deliver_news(channel, outbox.batch_for(channel.guild.id))
 
-# Función para limpiar HTML
-def clean_html(text):
+def drop_unreachable(guild, channel):
     """
-    Elimina las etiquetas HTML del texto y limpia el contenido.
+    Give up on what a guild waits for when its channel refused a send with 403
+    or 404, instead of retrying it every cycle until OUTBOX_MAX_AGE. Those errors
+    count towards Discord's invalid request limit. Returns whether it did.
     """
-    # Eliminar tags img completos
-    text = re.sub(r'<img[^>]+>', '', text)
-    # Eliminar otros tags HTML
-    text = re.sub(r'<[^>]+>', '', text)
-    # Eliminar múltiples espacios
-    text = re.sub(r'\s+', ' ', text)
-    # Limpiar espacios al inicio y final
-    text = text.strip()
-    return text
-    
-# Añadir esta función justo después de clean_html y antes de la configuración del bot
-def extract_url(link):
+    if channel.id not in unreachable_channels:
+        return False
+    logger.warning(f"Cannot post in the news channel of {guild.name}, dropping its pending news")
+    outbox.remove_guild(guild.id)
+    return True
+
+async def deliver_to_guild(guild, channel, current_time):
+    """Scheduled delivery of a guild's pending news"""
+    # Read when the job runs: a job queued behind another one for the same channel finds only what is left
+    batch = outbox.batch_for(guild.id)
+    if not batch:
+        return
+
+    last_update = server_config.get_last_update(guild.id)
+    update_message = "🎮 **Actualizando noticias de gaming**"
+    if last_update:
+        update_message += f"\nÚltima actualización fue a las {format_time(last_update)}"
+
+    if await send_with_rate_limit(channel, content=update_message) and await deliver_news(channel, batch):
+        server_config.set_last_update(guild.id, current_time)
+    else:
+        drop_unreachable(guild, channel)
+
+async def send_digest(channel, embeds):
+    """Send a digest in as few messages as possible, returns whether every message went through"""
+    for group in pack_embeds(embeds):
+        if not await send_with_rate_limit(channel, embeds=group):
+            logger.error(f"Error sending digest in {channel.guild.name}")
+            return False
+    return True
+
+async def deliver_digest(guild, channel, embeds, period_end, current_time):
+    """Scheduled delivery of a guild's digest"""
+    if await send_digest(channel, embeds):
+        digest_periods()[str(guild.id)] = period_end
+        server_config.set_last_update(guild.id, current_time)
+    elif drop_unreachable(guild, channel):
+        # Skip this period, the next digest tries the channel again
+        digest_periods()[str(guild.id)] = period_end
+
+def digest_jobs(destinations, current_time):
+    """Delivery jobs of the guilds in digest mode whose last complete period was not posted yet"""
+    jobs = []
+    posted = digest_periods()
+    for guild, channel in destinations:
+        interval = server_config.get_digest_interval(guild.id)
+        if not interval:
+            continue
+        start, end = period_bounds(interval, current_time.timestamp())
+        if posted.get(str(guild.id), 0) >= end:
+            continue
+        embeds = get_digest(start, end, server_config.get_filters(guild.id))
+        if embeds:
+            jobs.append((channel, functools.partial(deliver_digest, guild, channel, embeds, end, current_time)))
+    return jobs
+
+class FeedScheduler:
     """
-    Extrae la URL de diferentes formatos de enlaces que pueden venir en los feeds RSS.
-    
-    Args:
-        link: Puede ser una cadena de texto (URL directa), un diccionario con 'href',
-              o una lista de diccionarios con 'href'.
-    
-    Returns:
-        str: La URL extraída o '#' si no se encuentra ninguna URL válida.
+    Polls every feed on its own schedule.
+
+    Each feed's interval follows its publish rate (new entries per hour, as an
+    exponential moving average). Poll frequency is allocated proportionally to
+    the square root of that rate, which minimizes the average news latency for
+    a fixed number of requests, and the total is kept within FEED_POLL_BUDGET.
+    Polls are jittered so they stay spread over time. Failed polls are retried
+    with their own exponential backoff, which never changes the learned interval.
+    New entries are queued in pending_news until check_feeds delivers them.
     """
-    if isinstance(link, str):
-        return link
-    elif isinstance(link, list) and link:
-        return extract_url(link[0])
-    elif isinstance(link, dict):
-        return link.get('href', '#')
-    return '#'
+    def __init__(self, budget=FEED_POLL_BUDGET):
+        self.budget = budget
+        self.feeds = {}
+        self.pending_news = {}
+        self._task = None
+        self._polls = set()
+        # The loop only keeps weak references to tasks, running polls are held here
+        self._poll_tasks = set()
+        self._wakeup = asyncio.Event()
 
-# Discord bot configuration
-intents = discord.Intents.default()
-intents.message_content = True
-intents.guilds = True
-bot = commands.Bot(command_prefix="$", intents=intents)
-
-# Updated Gaming RSS feeds list
-GAMING_FEEDS = {
-    "Destructoid": "https://www.destructoid.com/feed/",
-    "Xbox Wire": "https://news.xbox.com/en-us/feed/",
-    "Kotaku": "https://kotaku.com/rss",
-    "VG247": "https://www.vg247.com/feed/news",
-    "Touch Arcade": "https://toucharcade.com/feed/",
-    "GameSpot": "https://www.gamespot.com/feeds/mashup/",
-    "IGN": "http://feeds.feedburner.com/ign/news",
-    "Polygon": "https://www.polygon.com/rss/index.xml",
-    "DualShockers": "https://www.dualshockers.com/feed/",
-    "Gematsu": "https://www.gematsu.com/feed",
-    "PC Gamer": "https://www.pcgamer.com/rss/",
-    "Eurogamer": "https://www.eurogamer.net/feed",
-    "Twinfinite": "https://twinfinite.net/feed/",
-    "Push Square": "https://www.pushsquare.com/feeds/latest",
-    "Pocket Gamer": "https://pocket4957.rssing.com/chan-78169779/index-latest.php",
-    "Siliconera": "https://www.siliconera.com/feed/",
-    "Nintendo Everything": "https://nintendoeverything.com/feed/",
-    "VGC": "https://www.videogameschronicle.com/category/news/feed/"
-}
-
-UPDATE_INTERVAL = 10800  # 3 hours in seconds
-MAX_RETRIES = 3
-RATE_LIMIT_DELAY = 2  # seconds between messages
+    def _get_budget(self):
+        # Default to the request volume of polling every feed once per UPDATE_INTERVAL
+        return self.budget or len(GAMING_FEEDS) * 3600 / UPDATE_INTERVAL
 
-class ServerConfig:
-    def __init__(self, config_file="server_config.json"):
-        self.config_file = config_file
-        self.config = self._load_config()
-        self.last_updates = {}
+    def _sync_feeds(self):
+        """Pick up feeds added to or removed from GAMING_FEEDS"""
+        now = time.monotonic()
+        new_feeds = [feed_name for feed_name in GAMING_FEEDS if feed_name not in self.feeds]
+        for index, feed_name in enumerate(new_feeds):
+            offset = (index + random.random()) * FEED_START_SPREAD / max(1, len(new_feeds))
+            self.feeds[feed_name] = {
+                'interval': UPDATE_INTERVAL,
+                'next_run': now + offset,
+                'last_poll': None,
+                'rate': None,
+                'failures': 0
+            }
+        for feed_name in list(self.feeds):
+            if feed_name not in GAMING_FEEDS:
+                del self.feeds[feed_name]
 
-    def _load_config(self):
-        try:
-            with open(self.config_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            logger.warning(f"Configuration file {self.config_file} not found or invalid. Creating new config.")
-            return {}
+    def _update_intervals(self):
+        known_rates = [state['rate'] for state in self.feeds.values() if state['rate'] is not None]
+        default_rate = sum(known_rates) / len(known_rates) if known_rates else 1.0
+        # Feeds that published nothing still get a small weight so they are polled now and then
+        weights = {
+            feed_name: max(state['rate'] if state['rate'] is not None else default_rate, 0.05) ** 0.5
+            for feed_name, state in self.feeds.items()
+        }
+        total_weight = sum(weights.values())
+        budget = self._get_budget()
+        for feed_name, state in self.feeds.items():
+            polls_per_hour = budget * weights[feed_name] / total_weight
+            state['interval'] = min(MAX_FEED_INTERVAL, max(MIN_FEED_INTERVAL, 3600 / polls_per_hour))
 
-    def _save_config(self):
+    def _record_poll(self, feed_name, new_count):
+        state = self.feeds[feed_name]
+        now = time.monotonic()
+        if state['last_poll'] is not None:
+            hours = max((now - state['last_poll']) / 3600, 1 / 60)
+            observed = new_count / hours
+            if state['rate'] is None:
+                state['rate'] = observed
+            else:
+                state['rate'] = FEED_RATE_SMOOTHING * observed + (1 - FEED_RATE_SMOOTHING) * state['rate']
+        state['last_poll'] = now
+        state['failures'] = 0
+        self._update_intervals()
+        state['next_run'] = now + state['interval'] * random.uniform(0.9, 1.1)
+
+    def _record_failure(self, feed_name):
+        state = self.feeds[feed_name]
+        state['failures'] += 1
+        # Never before the Retry-After of a 429
+        retry_at = feed_health.retry_time(feed_name) or 0.0
+        probe_at = feed_health.probe_time(feed_name)
+        if probe_at is not None:
+            # The circuit breaker decides when a failing feed is tried again
+            state['next_run'] = max(probe_at + random.uniform(0, 60), retry_at)
+            logger.warning(f"{feed_name} keeps failing, next probe in {(state['next_run'] - time.monotonic()) / 3600:.1f}h")
+            return
+        delay = min(MAX_FEED_INTERVAL, FEED_ERROR_BACKOFF * 2 ** (state['failures'] - 1))
+        state['next_run'] = max(time.monotonic() + delay * random.uniform(0.9, 1.1), retry_at)
+        logger.warning(
+            f"Poll of {feed_name} failed {state['failures']} time(s), retrying in {state['next_run'] - time.monotonic():.0f}s"
+        )
+
+    async def _poll(self, feed_name):
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f)
+            feed_url = GAMING_FEEDS.get(feed_name)
+            if not feed_url:
+                return
+            # No in-place retries, failures are rescheduled by _record_failure
+            entries = await fetch_entries(feed_name, feed_url, max_retries=0)
+            if feed_name not in self.feeds:
+                return
+            if entries is None:
+                self._record_failure(feed_name)
+                return
+
+            news_items = build_news_items(feed_name, entries)
+            if news_items:
+                self.pending_news.setdefault(feed_name, []).extend(news_items)
+            self._record_poll(feed_name, len(news_items))
+            logger.info(f"Next poll of {feed_name} in {self.feeds[feed_name]['interval'] / 60:.0f} minutes")
         except Exception as e:
-            logger.error(f"Error saving config: {str(e)}")
+            logger.error(f"Error polling {feed_name}: {type(e).__name__} - {str(e)}")
+            if feed_name in self.feeds:
+                self._record_failure(feed_name)
+        finally:
+            self._polls.discard(feed_name)
+            self._wakeup.set()
 
-    def set_news_channel(self, guild_id, channel_id):
-        self.config[str(guild_id)] = channel_id
-        self._save_config()
+    async def _run(self):
+        while True:
+            self._sync_feeds()
+            now = time.monotonic()
+            for feed_name, state in self.feeds.items():
+                if state['next_run'] <= now and feed_name not in self._polls:
+                    self._polls.add(feed_name)
+                    # fetch_semaphore still caps how many polls download at once
+                    task = asyncio.create_task(self._poll(feed_name))
+                    self._poll_tasks.add(task)
+                    task.add_done_callback(self._poll_tasks.discard)
 
-    def get_news_channel(self, guild_id):
-        return self.config.get(str(guild_id))
+            # Sleep until the next poll is due or a running poll finishes and reschedules its feed
+            waiting = [state['next_run'] for feed_name, state in self.feeds.items() if feed_name not in self._polls]
+            next_wake = min(waiting) - time.monotonic() if waiting else 60
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(60, max(1, next_wake)))
+            except asyncio.TimeoutError:
+                pass
 
-    def remove_server(self, guild_id):
-        if str(guild_id) in self.config:
-            del self.config[str(guild_id)]
-            self._save_config()
+    def is_running(self):
+        return self._task is not None and not self._task.done()
 
-    def get_last_update(self, guild_id):
-        return self.last_updates.get(str(guild_id))
+    def start(self):
+        self._task = asyncio.create_task(self._run())
 
-    def set_last_update(self, guild_id, time):
-        self.last_updates[str(guild_id)] = time
+    def export_state(self):
+        """The schedule with wall clock times, for restore_state after a restart"""
+        offset = time.time() - time.monotonic()
+        return {
+            feed_name: {
+                'interval': state['interval'],
+                'next_run': state['next_run'] + offset,
+                'last_poll': state['last_poll'] + offset if state['last_poll'] is not None else None,
+                'rate': state['rate'],
+                'failures': state['failures']
+            }
+            for feed_name, state in self.feeds.items()
+        }
 
-class NewsCache:
-    def __init__(self, cache_file="news_cache.json"):
-        self.cache_file = cache_file
-        self.cache = self._load_cache()
+    def restore_state(self, saved):
+        """
+        Continue a schedule saved by export_state.
 
-    def _load_cache(self):
-        try:
-            with open(self.cache_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        Feeds keep their learned interval and publish rate and are polled when
+        they were due. Feeds that became due while the bot was down are spread
+        over FEED_START_SPREAD instead of all being polled at once.
+        """
+        offset = time.monotonic() - time.time()
+        now = time.monotonic()
+        overdue = []
+        for feed_name, state in saved.items():
+            if feed_name not in GAMING_FEEDS:
+                continue
+            self.feeds[feed_name] = {
+                'interval': state['interval'],
+                'next_run': state['next_run'] + offset,
+                'last_poll': state['last_poll'] + offset if state['last_poll'] is not None else None,
+                'rate': state['rate'],
+                'failures': state['failures']
+            }
+            if self.feeds[feed_name]['next_run'] <= now:
+                overdue.append(feed_name)
+        for index, feed_name in enumerate(overdue):
+            self.feeds[feed_name]['next_run'] = now + (index + random.random()) * FEED_START_SPREAD / len(overdue)
+        if saved:
+            logger.info(f"Restored the schedule of {len(self.feeds)} feeds, {len(overdue)} overdue")
 
-    def _save_cache(self):
-        try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.cache, f)
-        except Exception as e:
-            logger.error(f"Error saving cache: {str(e)}")
+    def wake(self):
+        """Re-check the feed list now, used after the registry changes"""
+        self._wakeup.set()
 
-    def _generate_entry_hash(self, entry):
-        """Generate a unique hash for an entry based on title and date"""
-        hash_content = f"{entry.get('title', '')}{entry.get('published', '')}{entry.get('link', '')}"
-        return hashlib.md5(hash_content.encode()).hexdigest()
+    async def poll_now(self):
+        """Poll every feed immediately and wait for the results, outside of the schedule"""
+        self._sync_feeds()
+        feed_names = [feed_name for feed_name in self.feeds if feed_name not in self._polls]
+        self._polls.update(feed_names)
+        await asyncio.gather(*(self._poll(feed_name) for feed_name in feed_names))
 
-    def is_new_entry(self, feed_name, entry):
-        entry_id = entry.get('id', '') or entry.get('guid', '') or self._generate_entry_hash(entry)
-            
-        if feed_name not in self.cache:
-            self.cache[feed_name] = []
-
-        if entry_id not in self.cache[feed_name]:
-            self.cache[feed_name].append(entry_id)
-            # Keep only the latest 50 IDs
-            self.cache[feed_name] = self.cache[feed_name][-50:]
-            self._save_cache()
-            return True
-        return False
-        
-    def clear_cache(self, feed_name=None):
-        if feed_name:
-            if feed_name in self.cache:
-                self.cache[feed_name] = []
+    def take_pending(self):
+        """Return the news collected since the last call"""
+        batch, self.pending_news = self.pending_news, {}
+        return batch
+
+feed_scheduler = FeedScheduler()
+
+@tasks.loop(seconds=DELIVERY_INTERVAL)
+async def check_feeds():
+    with CHECK_FEEDS_SECONDS.time():
+        if BOT_ROLE == 'shard':
+            await run_shard_delivery_cycle()
+            runtime_state.save(last_delivery=time.time())
         else:
-            self.cache = {}
-        self._save_cache()
+            await run_delivery_cycle()
+            runtime_state.save(last_delivery=time.time(), feeds=feed_scheduler.export_state())
 
-server_config = ServerConfig()
-news_cache = NewsCache()
+@check_feeds.before_loop
+async def wait_for_delivery_slot():
+    """After a restart or a reconnect, keep the delivery cadence instead of delivering as soon as the bot is ready"""
+    last_delivery = runtime_state.get('last_delivery')
+    if last_delivery:
+        delay = last_delivery + DELIVERY_INTERVAL - time.time()
+        if delay > 0:
+            logger.info(f"Next delivery in {delay:.0f}s, continuing the schedule from before the restart")
+            await asyncio.sleep(delay)
 
-async def send_with_rate_limit(channel, content=None, embed=None):
-    """Send messages with rate limiting to avoid Discord API issues"""
-    try:
-        await asyncio.sleep(RATE_LIMIT_DELAY)
-        if embed:
-            await channel.send(embed=embed)
-        elif content:
-            await channel.send(content)
-    except Exception as e:
-        logger.error(f"Error sending message: {str(e)}")
+async def run_delivery_cycle():
+    current_time = datetime.now()
 
-def format_time(dt):
-    return dt.strftime("%H:%M")
+    # Fetch stage: feeds are polled on their own schedule by feed_scheduler
+    save_seen_entries()
 
-async def fetch_feed(feed_name, feed_url, max_retries=MAX_RETRIES):
-    async def try_fetch_with_backoff(attempt):
-        try:
-            if attempt > 0:
-                delay = min(300, (2 ** attempt) + (random.randint(0, 1000) / 1000))
-                await asyncio.sleep(delay)
-            
-            import ssl
-            if hasattr(ssl, '_create_unverified_context'):
-                ssl._create_default_https_context = ssl._create_unverified_context
-            
-            feed = feedparser.parse(feed_url)
-            
-            if hasattr(feed, 'status'):
-                if feed.status in [301, 302, 307, 308]:
-                    if 'href' in feed and feed.href != feed_url:
-                        logger.info(f"Redirecting {feed_name} to: {feed.href}")
-                        return await try_fetch_with_backoff(0)
-                elif feed.status == 429:
-                    if attempt < max_retries:
-                        logger.warning(f"Rate limit reached for {feed_name}, retrying...")
-                        return await try_fetch_with_backoff(attempt + 1)
-                    else:
-                        logger.error(f"Max retries reached for {feed_name}")
-                        return None
-                elif feed.status != 200:
-                    logger.error(f"Error fetching {feed_name}: Status {feed.status}")
-                    return None
-            
-            return feed
-            
-        except Exception as e:
-            logger.error(f"Error processing {feed_name}: {str(e)}")
-            if attempt < max_retries:
-                return await try_fetch_with_backoff(attempt + 1)
-            return None
+    # Delivery stage: every guild gets what the outbox holds for it, left-overs of earlier runs included
+    await deliver_outbox(get_news_channels(), current_time)
+    if store:
+        store.prune_deliveries()
+
+def stage_pending_news(batch=None):
+    """
+    Put the news polled since the last call, plus batch, where a crash cannot lose it:
+    the outbox and the digest window, or the shared store in the fetcher role.
+
+    Entries are marked seen in memory as soon as they are fetched, so this must
+    run before news_cache or feed_state_cache are written. Returns the staged batch.
+    """
+    if BOT_ROLE == 'shard':
+        return {}
+    pending = feed_scheduler.take_pending()
+    for feed_name, items in (batch or {}).items():
+        pending.setdefault(feed_name, []).extend(items)
+    batch = collapse_duplicates(pending)
+    if not batch:
+        return batch
+
+    count = sum(len(items) for items in batch.values())
+    if BOT_ROLE == 'fetcher':
+        published = store.publish_news([item.to_record() for items in batch.values() for item in items])
+        logger.info(f"Published {published} new entries from {len(batch)} sources for the shards")
+        store.prune_news()
+    else:
+        logger.info(f"Queued {count} new entries from {len(batch)} sources")
+        enqueue_for_guilds(batch, get_news_channels())
+        add_to_digest_window(batch)
+    return batch
+
+def save_seen_entries(batch=None):
+    """Stage the pending news (see stage_pending_news), then save the seen entries and the feed validators"""
+    stage_pending_news(batch)
+    # After a crash between the two steps the entries are fetched again: enqueue and
+    # publish_news ignore items they already hold, so nothing is lost or sent twice
+    news_cache.save()
+    feed_state_cache.save()
 
+def enqueue_for_guilds(batch, destinations):
+    """Queue a batch for every destination, trimmed by each guild's filters. Guilds in digest mode are skipped"""
+    routed = route_batch(batch)
+    outbox.enqueue({
+        str(guild.id): routed.get(str(guild.id), batch)
+        for guild, _ in destinations if not server_config.get_digest_interval(guild.id)
+    })
+
+def add_to_digest_window(batch):
+    digest_window.add([item for items in batch.values() for item in items])
+    runtime_state.save(digest_window=digest_window.export(NewsItem.to_record))
+
+async def deliver_outbox(destinations, current_time):
+    """Run a cycle's delivery jobs: the items the outbox holds and the digests that are due"""
+    outbox.expire()
+    jobs = [
+        (channel, functools.partial(deliver_to_guild, guild, channel, current_time))
+        for guild, channel in destinations if outbox.has_pending(guild.id)
+    ]
+    digests = digest_jobs(destinations, current_time)
+    if not jobs and not digests:
+        return 0
+    await delivery_scheduler.run_cycle(jobs + digests)
+    outbox.flush()
+    server_config.save_last_updates()
+    if digests:
+        runtime_state.save()
+    return len(jobs) + len(digests)
+
+async def publish_pending_news():
+    """Fetcher role: move the news polled since the last call into the shared store"""
+    save_seen_entries()
+    runtime_state.save(feeds=feed_scheduler.export_state())
+
+async def handle_fetcher_requests():
+    """Fetcher role: run the actions the shard processes asked for"""
+    for action, argument in store.take_fetcher_requests():
+        logger.info(f"Shard request: {action} {argument or ''}")
+        if action == 'poll':
+            await feed_scheduler.poll_now()
+        elif action == 'clear_cache':
+            stage_pending_news()
+            news_cache.clear_cache(argument)
+        elif action == 'reload_feeds':
+            reload_feed_registry()
+            # A shard marks the current entries of a new feed as seen
+            stage_pending_news()
+            news_cache.reload()
+            feed_scheduler.wake()
+
+async def run_fetcher():
+    """Fetcher role: poll the feeds and publish their news to the store, without connecting to Discord"""
+    logger.info(f"Starting fetcher for {len(GAMING_FEEDS)} feeds, publishing to {DATABASE_FILE}")
+    await start_metrics()
+    await asyncio.to_thread(start_parse_workers)
+    feed_scheduler.restore_state(runtime_state.get('feeds', {}))
+    feed_scheduler.start()
+    log_startup_time()
     try:
-        feed = await try_fetch_with_backoff(0)
-        if not feed:
-            return []
+        while True:
+            await handle_fetcher_requests()
+            await publish_pending_news()
+            await asyncio.sleep(FETCHER_LOOP_INTERVAL)
+    finally:
+        await close_http_session()
+        shutdown_parse_executor()
 
-        news_items = []
-        logger.info(f"Processing {feed_name}: {len(feed.entries)} entries found")
-        
-        for entry in feed.entries[:5]:
-            if news_cache.is_new_entry(feed_name, entry):
-                logger.info(f"New entry found in {feed_name}")
-                title = entry.get('title', 'Sin título')
-                
-                # Proceso del link
-                raw_link = entry.get('link', '#')
-                link = extract_url(raw_link)
-                
-                # Remove UTM parameters
-                if '?' in link:
-                    link = link.split('?')[0]
-
-                published = entry.get('published', 'Fecha no disponible')
-                
-                # Obtener y limpiar el resumen
-                summary = entry.get('summary', '')
-                summary = clean_html(summary)  # Aplicamos la limpieza de HTML
-                if len(summary) > 300:
-                    summary = summary[:297] + "..."
-
-                # Find image URL
-                image_url = None
-                try:
-                    if 'media_thumbnail' in entry and entry['media_thumbnail']:
-                        image_url = extract_url(entry['media_thumbnail'][0].get('url', ''))
-                    elif 'media_content' in entry and entry['media_content']:
-                        image_url = extract_url(entry['media_content'][0].get('url', ''))
-                    elif hasattr(entry, 'links'):
-                        for link_item in entry.links:
-                            if isinstance(link_item, dict) and link_item.get('type', '').startswith('image/'):
-                                image_url = extract_url(link_item)
-                                break
-
-                    if image_url and not (image_url.startswith('http://') or image_url.startswith('https://')):
-                        image_url = None
-                except Exception as e:
-                    logger.error(f"Error processing image for {feed_name}: {str(e)}")
-                    image_url = None
-
-                embed = discord.Embed(
-                    title=title,
-                    url=link,
-                    description=summary if summary else None,
-                    color=discord.Color.blue()
-                )
-                
-                embed.set_footer(text=f"Fuente: {feed_name} | Publicado: {published}")
-                
-                if image_url:
-                    embed.set_thumbnail(url=image_url)
+def reload_feed_registry():
+    """Re-read the feed list. Returns the feeds, see FeedRegistry.reload"""
+    previous = {feed_name: feed['url'] for feed_name, feed in feed_registry.feeds.items()}
+    feeds = feed_registry.reload()
+    for feed_name, feed in feeds.items():
+        if previous.get(feed_name) != feed['url']:
+            # New or moved feed: old validators and failures belong to another URL
+            if feed_name in previous:
+                feed_state_cache.update(feed_name, None, None, [])
+            feed_health.reset(feed_name)
+    return feeds
 
-                news_items.append(embed)
+def notify_fetcher(action, argument=None):
+    """Shard role: ask the fetcher process to act on the feeds it owns"""
+    store.request_fetcher(action, argument)
 
-        return news_items
-    except Exception as e:
-        logger.error(f"Error processing {feed_name}: {str(e)}")
-        return []
-@tasks.loop(seconds=UPDATE_INTERVAL)
-async def check_feeds():
+def feeds_changed():
+    """Make the process that polls the feeds pick up a registry change"""
+    if BOT_ROLE == 'shard':
+        notify_fetcher('reload_feeds')
+    else:
+        feed_scheduler.wake()
+
+# One shard delivery at a time, so a manual update never reads a cursor a running cycle is about to move
+shard_delivery_lock = asyncio.Lock()
+
+async def run_shard_delivery_cycle(destinations=None):
+    """
+    Shard role: deliver the items the fetcher stored since each guild was last served.
+
+    Every guild has a cursor, the sequence number of the last stored item queued
+    for it. New items are put in the outbox and the cursors moved in the same
+    transaction, then delivered and acknowledged item by item like in the
+    single process mode. No item reaches a guild twice or is skipped, even when
+    shards restart or guilds move to another shard. Guilds without a cursor
+    (just configured) start with the items published after that point.
+
+    Returns:
+        int: Number of guilds that had news to deliver.
+    """
+    async with shard_delivery_lock:
+        return await _run_shard_delivery_cycle(get_news_channels() if destinations is None else destinations)
+
+async def _run_shard_delivery_cycle(destinations):
     current_time = datetime.now()
-    logger.info("Starting scheduled news check")
+    if not destinations:
+        return 0
 
-    for guild in bot.guilds:
-        channel_id = server_config.get_news_channel(guild.id)
-        if not channel_id:
-            continue
+    latest_seq = store.latest_news_seq()
+    cursors = store.load_guild_cursors()
+    new_guilds = {str(guild.id): latest_seq for guild, _ in destinations if str(guild.id) not in cursors}
+    if new_guilds:
+        store.set_guild_cursors(new_guilds)
+        cursors.update(new_guilds)
 
-        channel = bot.get_channel(channel_id)
-        if not channel:
+    # Guilds usually share a cursor, each distinct one is turned into a batch and routed once
+    by_cursor = {}
+    digest_cursors = {}
+    for guild, channel in destinations:
+        if cursors[str(guild.id)] >= latest_seq:
             continue
+        if server_config.get_digest_interval(guild.id):
+            # Digests read the store by time, the cursor only moves so leaving digest mode starts from now
+            digest_cursors[str(guild.id)] = latest_seq
+        else:
+            by_cursor.setdefault(cursors[str(guild.id)], []).append((guild, channel))
+    if digest_cursors:
+        store.set_guild_cursors(digest_cursors)
 
-        last_update = server_config.get_last_update(guild.id)
-        update_message = "🎮 **Actualizando noticias de gaming**"
-        if last_update:
-            update_message += f"\nÚltima actualización fue a las {format_time(last_update)}"
+    if by_cursor:
+        records = store.load_news(min(by_cursor), latest_seq)
+        items = [(seq, NewsItem.from_record(record)) for seq, record in records]
+        guild_batches = {}
+        for cursor, guilds in by_cursor.items():
+            batch = {}
+            for seq, item in items:
+                if seq > cursor:
+                    batch.setdefault(item.feed_name, []).append(item)
+            routed = route_batch(batch)
+            for guild, _ in guilds:
+                guild_batches[str(guild.id)] = routed.get(str(guild.id), batch)
+        outbox.enqueue(guild_batches, cursors={guild_id: latest_seq for guild_id in guild_batches})
+        logger.info(f"Queued {len(items)} stored entries for {len(guild_batches)} guilds")
 
-        await send_with_rate_limit(channel, content=update_message)
+    delivered = await deliver_outbox(destinations, current_time)
+    store.prune_deliveries()
+    return delivered
 
-        news_found = False
-        for feed_name, feed_url in GAMING_FEEDS.items():
-            news_items = await fetch_feed(feed_name, feed_url)
-            if news_items:
-                news_found = True
-                try:
-                    header = f"▓▓▓▓▓▓▓▓▓▓ Noticias de {feed_name} ▓▓▓▓▓▓▓▓▓▓"
-                    await send_with_rate_limit(channel, content=f"**{header}**")
-                    
-                    for embed in news_items:
-                        await send_with_rate_limit(channel, embed=embed)
-                    
-                    await send_with_rate_limit(channel, content="_ _")
-                except Exception as e:
-                    logger.error(f"Error sending news from {feed_name} in {guild.name}: {str(e)}")
-                    continue
-
-        if not news_found:
-            await send_with_rate_limit(channel, content="No se encontraron noticias nuevas en esta actualización.")
+_ready_seconds = None
 
-        server_config.set_last_update(guild.id, current_time)
+def log_startup_time():
+    """Record the import-to-ready time once, reconnects fire on_ready again"""
+    global _ready_seconds
+    if _ready_seconds is not None:
+        return
+    _ready_seconds = time.perf_counter() - STARTUP_BEGAN
+    STARTUP_SECONDS.set(_ready_seconds, phase='ready')
+    logger.info(f"Ready {_ready_seconds:.2f}s after start (imports and state loading took {IMPORT_SECONDS:.2f}s)")
+
+_metrics_runner = None
+_lag_monitor = None
+
+async def start_metrics():
+    """Start the metrics endpoint and the event loop lag monitor, once"""
+    global _metrics_runner, _lag_monitor
+    if _metrics_runner is not None or not METRICS_PORT:
+        return
+    try:
+        _metrics_runner = await start_metrics_server(metrics_registry, METRICS_HOST, METRICS_PORT)
+    except OSError as e:
+        logger.error(f"Could not start metrics endpoint on port {METRICS_PORT}: {str(e)}")
+        return
+    _lag_monitor = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG, EVENT_LOOP_LAG_HISTOGRAM))
 
 @bot.event
 async def on_ready():
     logger.info(f'{bot.user} has logged in')
+    log_startup_time()
+    start_polling = BOT_ROLE != 'shard' and not feed_scheduler.is_running()
+    if start_polling:
+        # Before the first await: a command handled meanwhile adds to the restored window, not to an empty one
+        feed_scheduler.restore_state(runtime_state.get('feeds', {}))
+        digest_window.restore(runtime_state.get('digest_window', []), NewsItem.from_record)
+    await start_metrics()
+    if start_polling:
+        await asyncio.to_thread(start_parse_workers)
+        feed_scheduler.start()
     if not check_feeds.is_running():
         check_feeds.start()
 
@@ -382,9 +2706,149 @@ async def configurar_canal(ctx):
 async def desactivar_noticias(ctx):
     """Desactiva las noticias en este servidor"""
     server_config.remove_server(ctx.guild.id)
+    outbox.remove_guild(ctx.guild.id)
     await ctx.send("❌ Las noticias han sido desactivadas en este servidor.")
     logger.info(f'News disabled for guild {ctx.guild.name}')
 
+def parse_list_argument(text):
+    """Split a comma separated command argument"""
+    if not text:
+        return []
+    return [value.strip() for value in text.split(',') if value.strip()]
+
+@bot.command()
+@commands.check_any(
+    commands.has_permissions(administrator=True),
+    commands.has_permissions(manage_channels=True),
+    commands.has_permissions(manage_guild=True)
+)
+async def filtrar_fuentes(ctx, *, fuentes=None):
+    """Limita las noticias a algunas fuentes (separadas por comas), sin argumentos vuelve a todas"""
+    seleccion = []
+    for fuente in parse_list_argument(fuentes):
+        fuente_encontrada = next((name for name in GAMING_FEEDS if name.lower() == fuente.lower()), None)
+        if not fuente_encontrada:
+            fuentes_disponibles = "\n".join([f"• {name}" for name in GAMING_FEEDS.keys()])
+            await ctx.send(f"❌ Fuente no encontrada: {fuente}. Las fuentes disponibles son:\n{fuentes_disponibles}")
+            return
+        seleccion.append(fuente_encontrada)
+
+    server_config.set_filter(ctx.guild.id, 'sources', seleccion)
+    if seleccion:
+        await ctx.send(f"✅ Este servidor solo recibirá noticias de: {', '.join(seleccion)}")
+    else:
+        await ctx.send("✅ Este servidor recibirá noticias de todas las fuentes.")
+    logger.info(f'Source filter updated for guild {ctx.guild.name}: {seleccion}')
+
+@bot.command()
+@commands.check_any(
+    commands.has_permissions(administrator=True),
+    commands.has_permissions(manage_channels=True),
+    commands.has_permissions(manage_guild=True)
+)
+async def incluir_palabras(ctx, *, palabras=None):
+    """Solo publica noticias que contengan alguna de estas palabras (separadas por comas)"""
+    seleccion = parse_list_argument(palabras)
+    server_config.set_filter(ctx.guild.id, 'include', seleccion)
+    if seleccion:
+        await ctx.send(f"✅ Solo se publicarán noticias que mencionen: {', '.join(seleccion)}")
+    else:
+        await ctx.send("✅ Filtro de palabras incluidas eliminado.")
+    logger.info(f'Include filter updated for guild {ctx.guild.name}: {seleccion}')
+
+@bot.command()
+@commands.check_any(
+    commands.has_permissions(administrator=True),
+    commands.has_permissions(manage_channels=True),
+    commands.has_permissions(manage_guild=True)
+)
+async def excluir_palabras(ctx, *, palabras=None):
+    """No publica noticias que contengan alguna de estas palabras (separadas por comas)"""
+    seleccion = parse_list_argument(palabras)
+    server_config.set_filter(ctx.guild.id, 'exclude', seleccion)
+    if seleccion:
+        await ctx.send(f"✅ Se omitirán las noticias que mencionen: {', '.join(seleccion)}")
+    else:
+        await ctx.send("✅ Filtro de palabras excluidas eliminado.")
+    logger.info(f'Exclude filter updated for guild {ctx.guild.name}: {seleccion}')
+
+@bot.command()
+@commands.check_any(
+    commands.has_permissions(administrator=True),
+    commands.has_permissions(manage_channels=True),
+    commands.has_permissions(manage_guild=True)
+)
+async def quitar_filtros(ctx):
+    """Elimina todos los filtros de este servidor"""
+    server_config.clear_filters(ctx.guild.id)
+    await ctx.send("🧹 Filtros eliminados, se recibirán todas las noticias.")
+    logger.info(f'Filters cleared for guild {ctx.guild.name}')
+
+@bot.command()
+@commands.check_any(
+    commands.has_permissions(administrator=True),
+    commands.has_permissions(manage_channels=True),
+    commands.has_permissions(manage_guild=True)
+)
+async def activar_resumen(ctx, horas: int = DEFAULT_DIGEST_HOURS):
+    """Publica un resumen cada cierto número de horas en lugar de cada noticia"""
+    if not 1 <= horas <= DIGEST_WINDOW // 3600:
+        await ctx.send(f"❌ El intervalo debe estar entre 1 y {DIGEST_WINDOW // 3600} horas.")
+        return
+
+    server_config.set_digest_interval(ctx.guild.id, horas)
+    # Lo que quedaba por enviar ya forma parte del resumen
+    outbox.remove_guild(ctx.guild.id)
+    await ctx.send(
+        f"✅ Este servidor recibirá un resumen de noticias cada {horas} horas en lugar de cada noticia. "
+        f"Usa `$resumen` para ver el resumen actual."
+    )
+    logger.info(f'Digest mode enabled for guild {ctx.guild.name}: every {horas}h')
+
+@bot.command()
+@commands.check_any(
+    commands.has_permissions(administrator=True),
+    commands.has_permissions(manage_channels=True),
+    commands.has_permissions(manage_guild=True)
+)
+async def desactivar_resumen(ctx):
+    """Vuelve a publicar cada noticia en lugar de un resumen"""
+    server_config.set_digest_interval(ctx.guild.id, None)
+    await ctx.send("✅ Este servidor volverá a recibir cada noticia a medida que se publique.")
+    logger.info(f'Digest mode disabled for guild {ctx.guild.name}')
+
+async def send_current_digest(channel, guild_id, hours=None):
+    """Send the digest of the last hours (the guild's digest interval by default), rounded to the minute"""
+    interval = hours * 3600 if hours else server_config.get_digest_interval(guild_id) or DEFAULT_DIGEST_HOURS * 3600
+    end = time.time()
+    end -= end % 60
+    embeds = get_digest(end - interval, end, server_config.get_filters(guild_id))
+    if not embeds:
+        await send_with_rate_limit(channel, content=f"No hay noticias en las últimas {interval // 3600} horas.")
+        return
+    await send_digest(channel, embeds)
+
+@bot.command()
+async def resumen(ctx, horas: int = None):
+    """Muestra el resumen de las noticias de las últimas horas"""
+    if horas is not None and not 1 <= horas <= DIGEST_WINDOW // 3600:
+        await ctx.send(f"❌ El intervalo debe estar entre 1 y {DIGEST_WINDOW // 3600} horas.")
+        return
+    await send_current_digest(ctx.channel, ctx.guild.id, horas)
+
+@bot.command()
+async def filtros(ctx):
+    """Muestra los filtros de noticias de este servidor"""
+    guild_filters = server_config.get_filters(ctx.guild.id)
+    embed = discord.Embed(
+        title="Filtros de Noticias",
+        color=discord.Color.green()
+    )
+    embed.add_field(name="Fuentes", value=", ".join(guild_filters.get('sources', [])) or "Todas", inline=False)
+    embed.add_field(name="Incluir palabras", value=", ".join(guild_filters.get('include', [])) or "—", inline=False)
+    embed.add_field(name="Excluir palabras", value=", ".join(guild_filters.get('exclude', [])) or "—", inline=False)
+    await ctx.send(embed=embed)
+
 @bot.command()
 async def fuentes(ctx):
     """Muestra la lista de fuentes configuradas"""
@@ -392,10 +2856,115 @@ async def fuentes(ctx):
         title="Fuentes de Noticias Configuradas",
         color=discord.Color.green()
     )
-    sources_text = "\n".join([f"• {name}" for name in GAMING_FEEDS.keys()])
-    embed.description = sources_text
+    lines = []
+    for name, feed in feed_registry.feeds.items():
+        probe_at = feed_health.probe_time(name)
+        if not feed.get('enabled', True):
+            lines.append(f"• ~~{name}~~ (desactivada)")
+        elif probe_at is not None:
+            next_probe = datetime.now() + timedelta(seconds=max(0, probe_at - time.monotonic()))
+            lines.append(f"• {name} ⚠️ sin respuesta, se reintentará a las {format_time(next_probe)}")
+        else:
+            lines.append(f"• {name}")
+    embed.description = "\n".join(lines)
     await ctx.send(embed=embed)
 
+def is_operator():
+    """Check for the commands that change what every guild receives: the bot's owner or BOT_OPERATORS only"""
+    async def predicate(ctx):
+        if ctx.author.id in BOT_OPERATORS or await ctx.bot.is_owner(ctx.author):
+            return True
+        raise commands.NotOwner("Only the bot's operators can change the feed list")
+    return commands.check(predicate)
+
+@bot.command()
+@is_operator()
+async def agregar_fuente(ctx, url, *, nombre):
+    """Agrega una fuente nueva: $agregar_fuente <url> <nombre>"""
+    nombre = nombre.strip()
+    existente = feed_registry.find(nombre)
+    if existente and feed_registry.feeds[existente]['url'] == url:
+        await ctx.send(f"❌ La fuente {existente} ya existe con esa URL.")
+        return
+
+    await ctx.send(f"🔎 Comprobando {url}...")
+    entries, error = await validate_feed(nombre, url)
+    if error:
+        await ctx.send(f"❌ No se pudo agregar la fuente: {error}")
+        return
+
+    nombre = existente or nombre
+    if existente:
+        # Nueva URL para una fuente conocida: los validadores HTTP de la anterior ya no sirven
+        feed_state_cache.update(nombre, None, None, [])
+    # Las entradas actuales cuentan como vistas, solo se publicarán las noticias que lleguen a partir de ahora
+    for entry in entries:
+        news_cache.is_new_entry(nombre, entry)
+    save_seen_entries()
+
+    feed_registry.add(nombre, url)
+    feed_health.reset(nombre)
+    feeds_changed()
+    await ctx.send(f"✅ Fuente {nombre} agregada ({len(entries)} entradas encontradas).")
+    logger.info(f'Feed {nombre} added by guild {ctx.guild.name}: {url}')
+
+@bot.command()
+@is_operator()
+async def desactivar_fuente(ctx, *, nombre):
+    """Deja de consultar una fuente sin olvidar su estado"""
+    fuente = feed_registry.find(nombre)
+    if not fuente:
+        await ctx.send(f"❌ Fuente no encontrada: {nombre}")
+        return
+
+    feed_registry.set_enabled(fuente, False)
+    feeds_changed()
+    await ctx.send(f"⏸️ Fuente {fuente} desactivada. Usa `$activar_fuente {fuente}` para reactivarla.")
+    logger.info(f'Feed {fuente} disabled')
+
+@bot.command()
+@is_operator()
+async def activar_fuente(ctx, *, nombre):
+    """Vuelve a consultar una fuente desactivada"""
+    fuente = feed_registry.find(nombre)
+    if not fuente:
+        await ctx.send(f"❌ Fuente no encontrada: {nombre}")
+        return
+
+    feed_registry.set_enabled(fuente, True)
+    feed_health.reset(fuente)
+    feeds_changed()
+    await ctx.send(f"▶️ Fuente {fuente} activada.")
+    logger.info(f'Feed {fuente} enabled')
+
+@bot.command()
+@is_operator()
+async def eliminar_fuente(ctx, *, nombre):
+    """Elimina una fuente y su caché"""
+    fuente = feed_registry.find(nombre)
+    if not fuente:
+        await ctx.send(f"❌ Fuente no encontrada: {nombre}")
+        return
+
+    feed_registry.remove(fuente)
+    feed_health.reset(fuente)
+    feeds_changed()
+    clear_news_cache(fuente)
+    feed_state_cache.update(fuente, None, None, [])
+    save_seen_entries()
+    await ctx.send(f"🗑️ Fuente {fuente} eliminada.")
+    logger.info(f'Feed {fuente} removed')
+
+@bot.command()
+@is_operator()
+async def recargar_fuentes(ctx):
+    """Vuelve a leer la lista de fuentes (por ejemplo tras editar feeds.json)"""
+    feeds = reload_feed_registry()
+    feeds_changed()
+    activas = sum(1 for feed in feeds.values() if feed.get('enabled', True))
+    await ctx.send(f"🔄 Lista de fuentes recargada: {activas} activas de {len(feeds)}.")
+    logger.info('Feed registry reloaded')
+
 @bot.command()
 async def estado(ctx):
     """Muestra el estado actual del bot en este servidor"""
@@ -409,7 +2978,11 @@ async def estado(ctx):
         )
         if last_update:
             status += f"🕒 Última actualización: {format_time(last_update)}\n"
-        status += f"⏱️ Intervalo de actualización: cada 3 horas"
+        digest_interval = server_config.get_digest_interval(ctx.guild.id)
+        if digest_interval:
+            status += f"📰 Modo resumen: un resumen cada {digest_interval // 3600} horas, cada fuente se consulta según su frecuencia de publicación"
+        else:
+            status += f"⏱️ Noticias nuevas publicadas cada {DELIVERY_INTERVAL // 60} minutos, cada fuente se consulta según su frecuencia de publicación"
     else:
         status = "❌ El bot no está configurado en este servidor. Usa `$configurar_canal` para activarlo."
 
@@ -436,23 +3009,34 @@ async def actualizar(ctx):
     await send_with_rate_limit(channel, content="🎮 **Actualizando noticias de gaming bajo demanda...**")
     logger.info(f'Manual update requested in guild {ctx.guild.name}')
 
-    news_found = False
-    for feed_name, feed_url in GAMING_FEEDS.items():
-        news_items = await fetch_feed(feed_name, feed_url)
-        if news_items:
-            news_found = True
-            header = f"▓▓▓▓▓▓▓▓▓▓ Noticias de {feed_name} ▓▓▓▓▓▓▓▓▓▓"
-            await send_with_rate_limit(channel, content=f"**{header}**")
-            
-            for embed in news_items:
-                await send_with_rate_limit(channel, embed=embed)
-            
-            await send_with_rate_limit(channel, content="_ _")
+    if BOT_ROLE == 'shard':
+        # The fetcher process owns the feeds: deliver what it already stored and have it poll now,
+        # anything new arrives with the next delivery
+        notify_fetcher('poll')
+        if server_config.get_digest_interval(ctx.guild.id):
+            await delivery_scheduler.submit(channel, functools.partial(send_current_digest, channel, ctx.guild.id))
+        elif not await run_shard_delivery_cycle([(ctx.guild, channel)]):
+            await send_with_rate_limit(channel, content="No se encontraron noticias nuevas en esta actualización.")
+        return
 
-    if not news_found:
-        await send_with_rate_limit(channel, content="No se encontraron noticias nuevas en esta actualización.")
+    # Queued for every guild with what the scheduler polled, the others receive it with the next scheduled delivery
+    save_seen_entries(await fetch_all_feeds())
+    # Goes through the channel queue so it never interleaves with a scheduled delivery
+    if server_config.get_digest_interval(ctx.guild.id):
+        await delivery_scheduler.submit(channel, functools.partial(send_current_digest, channel, ctx.guild.id))
+    else:
+        await delivery_scheduler.submit(channel, functools.partial(deliver_pending_news, channel))
+    outbox.flush()
 
     server_config.set_last_update(ctx.guild.id, current_time)
+    server_config.save_last_updates()
+
+def clear_news_cache(feed_name=None):
+    if BOT_ROLE == 'shard':
+        notify_fetcher('clear_cache', feed_name)
+    else:
+        stage_pending_news()
+        news_cache.clear_cache(feed_name)
 
 @bot.command()
 async def limpiar_cache(ctx, fuente=None):
@@ -465,14 +3049,14 @@ async def limpiar_cache(ctx, fuente=None):
                 break
         
         if fuente_encontrada:
-            news_cache.clear_cache(fuente_encontrada)
+            clear_news_cache(fuente_encontrada)
             await ctx.send(f"🧹 Cache limpiado para la fuente: {fuente_encontrada}")
             logger.info(f'Cache cleared for source {fuente_encontrada}')
         else:
             fuentes_disponibles = "\n".join([f"• {name}" for name in GAMING_FEEDS.keys()])
             await ctx.send(f"❌ Fuente no encontrada. Las fuentes disponibles son:\n{fuentes_disponibles}")
     else:
-        news_cache.clear_cache()
+        clear_news_cache()
         await ctx.send("🧹 Cache limpiado completamente")
         logger.info('Complete cache clear performed')
 
@@ -502,13 +3086,44 @@ async def verificar_permisos(ctx):
 
 @configurar_canal.error
 @desactivar_noticias.error
+@filtrar_fuentes.error
+@incluir_palabras.error
+@excluir_palabras.error
+@quitar_filtros.error
+@activar_resumen.error
+@desactivar_resumen.error
 async def admin_error(ctx, error):
     if isinstance(error, commands.MissingPermissions):
         await ctx.send("❌ Necesitas permisos de administrador para usar este comando.")
         logger.warning(f'Permission denied for user in guild {ctx.guild.name}')
 
+@agregar_fuente.error
+@desactivar_fuente.error
+@activar_fuente.error
+@eliminar_fuente.error
+@recargar_fuentes.error
+async def operator_error(ctx, error):
+    if isinstance(error, commands.NotOwner):
+        await ctx.send("❌ La lista de fuentes es compartida por todos los servidores, solo los operadores del bot pueden cambiarla.")
+        logger.warning(f'Feed registry command denied for user {ctx.author.id} in guild {ctx.guild.name}')
+
 # Main bot startup
 if __name__ == "__main__":
+    configure_logging()
+    init_state()
+    if BOT_ROLE not in ('all', 'fetcher', 'shard'):
+        logger.error(f"Unknown BOT_ROLE {BOT_ROLE}, use all, fetcher or shard")
+        exit(1)
+    if BOT_ROLE != 'all' and not store:
+        logger.error(f"BOT_ROLE={BOT_ROLE} needs the shared database, set STORAGE_BACKEND=sqlite")
+        exit(1)
+    if BOT_ROLE == 'fetcher':
+        try:
+            asyncio.run(run_fetcher())
+        except KeyboardInterrupt:
+            logger.info("Fetcher stopped")
+        exit(0)
+
     TOKEN = os.getenv('DISCORD_TOKEN')
     if not TOKEN:
         logger.error("Discord token not found in environment variables")
@@ -0,0 +1,231 @@
+"""
+Cross-source duplicate story detection.
+
+Several outlets usually cover the same announcement within minutes. StoryIndex
+keeps a rolling window of recently published stories and finds an incoming
+item's duplicate either by its canonical URL or, for different URLs, by
+near-duplicate headlines: titles are reduced to word bigrams, summarized with
+MinHash and bucketed with LSH, so a lookup only compares against the few
+stories sharing a bucket instead of the whole window. Items of the same feed
+are never merged with each other.
+"""
+import re
+import time
+import random
+import hashlib
+import unicodedata
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'cmpid', 'ocid', 'ito', 'taid', 'icid', 'ftag', 'guccounter'
+}
+
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'with', 'at', 'by',
+    'from', 'is', 'are', 'was', 'be', 'as', 'its', 'it', 'this', 'that', 'new', 'all',
+    'how', 'what', 'here', 'heres', 'has', 'have', 'will', 'now', 'up', 'out', 'about'
+}
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+def canonical_url(url):
+    """
+    Normalize a URL so the same article linked from different places compares equal.
+    Returns None for links without a host, like the '#' placeholder of items without a link.
+    """
+    try:
+        parts = urlsplit((url or '').strip())
+    except ValueError:
+        return None
+    host = parts.netloc.lower()
+    if not host:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    ))
+    # The scheme and the fragment never change which article is served
+    return urlunsplit(('', host, path, query, ''))
+
+def title_shingles(title):
+    """
+    Word bigrams of a headline, accents, case, punctuation and stopwords removed.
+    Bigrams keep word order, so "Z-A Review" and "Z-A Preview" differ in more than one word.
+    """
+    text = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode().lower()
+    text = text.replace("'", '')
+    words = [word for word in _WORD_RE.findall(text) if word not in STOPWORDS]
+    if len(words) < 2:
+        return set(words)
+    return {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second) if first or second else 0.0
+
+def _stable_hash(value):
+    # Python's hash() is salted per process, MinHash signatures must be reproducible
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class MinHasher:
+    """MinHash signatures whose LSH bands collide for sets with Jaccard similarity above ~threshold"""
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm=64, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self.permutations = [
+            (rng.randrange(1, self.PRIME), rng.randrange(0, self.PRIME)) for _ in range(num_perm)
+        ]
+
+    @property
+    def threshold(self):
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def signature(self, shingles):
+        hashes = [_stable_hash(shingle) for shingle in shingles]
+        return tuple(
+            min((a * value + b) % self.PRIME for value in hashes)
+            for a, b in self.permutations
+        )
+
+    def band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+class StoryIndex:
+    """
+    Rolling window of published stories used to collapse duplicates across feeds.
+
+    Args:
+        window: Seconds a story stays in the index.
+        threshold: Jaccard similarity of the headline bigrams of two items to call them the same
+            story. LSH only picks the candidates, the similarity is computed exactly.
+        min_shingles: Headlines with fewer bigrams are only matched by URL.
+    """
+    def __init__(self, window=24 * 3600, threshold=0.65, min_shingles=3, hasher=None):
+        self.window = window
+        self.threshold = threshold
+        self.min_shingles = min_shingles
+        self.hasher = hasher or MinHasher()
+        self._stories = {}
+        self._by_url = {}
+        self._buckets = {}
+        self._order = deque()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._stories)
+
+    def _expire(self, now):
+        while self._order and self._order[0][0] < now - self.window:
+            _, story_id = self._order.popleft()
+            story = self._stories.pop(story_id)
+            if story['url'] is not None and self._by_url.get(story['url']) == story_id:
+                del self._by_url[story['url']]
+            for key in story['bands']:
+                bucket = self._buckets.get(key)
+                if bucket:
+                    bucket.discard(story_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def _describe(self, item):
+        url = canonical_url(item.link)
+        shingles = title_shingles(item.title)
+        signature = self.hasher.signature(shingles) if len(shingles) >= self.min_shingles else None
+        return url, shingles, signature
+
+    def find(self, item):
+        """Return the story of another feed matching an item, or None"""
+        story, _ = self._find(item.feed_name, *self._describe(item))
+        return story
+
+    def _find(self, feed_name, url, shingles, signature):
+        """Return (story, exact): exact when the URL or the whole headline is the same"""
+        story_id = self._by_url.get(url) if url is not None else None
+        if story_id is not None and feed_name not in self._stories[story_id]['feeds']:
+            return self._stories[story_id], True
+        if signature is None:
+            return None, False
+
+        candidates = set()
+        for key in self.hasher.band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best, best_score = None, self.threshold
+        for story_id in candidates:
+            story = self._stories[story_id]
+            if feed_name in story['feeds']:
+                continue
+            score = jaccard(shingles, story['shingles'])
+            if score >= best_score:
+                best, best_score = story, score
+        return best, best is not None and best_score == 1.0
+
+    def _add(self, item, url, shingles, signature, now):
+        story_id = self._next_id
+        self._next_id += 1
+        bands = self.hasher.band_keys(signature) if signature is not None else []
+        story = {
+            'item': item, 'url': url, 'shingles': shingles, 'signature': signature, 'bands': bands,
+            'feeds': {item.feed_name}, 'new': True
+        }
+        self._stories[story_id] = story
+        if url is not None:
+            self._by_url.setdefault(url, story_id)
+        for key in bands:
+            self._buckets.setdefault(key, set()).add(story_id)
+        self._order.append((now, story_id))
+        return story
+
+    def collapse(self, batch):
+        """
+        Merge the duplicates of a batch ({feed_name: [items]}) into a single item.
+
+        The first item of a story stays in the batch and lists the other sources
+        in its other_sources; later copies are removed. An item matching a story
+        of an earlier batch is only dropped when it is the same article (same URL
+        or same headline), a merely similar one is kept and links the earlier
+        coverage in its other_sources.
+
+        Returns:
+            tuple: (the collapsed batch, number of items removed)
+        """
+        now = time.time()
+        self._expire(now)
+        for story in self._stories.values():
+            story['new'] = False
+
+        collapsed = {}
+        removed = 0
+        for feed_name, items in batch.items():
+            for item in items:
+                url, shingles, signature = self._describe(item)
+                story, exact = self._find(item.feed_name, url, shingles, signature)
+                if story is None:
+                    self._add(item, url, shingles, signature, now)
+                    collapsed.setdefault(feed_name, []).append(item)
+                    continue
+
+                story['feeds'].add(item.feed_name)
+                primary = story['item']
+                if story['new']:
+                    primary.other_sources.append((item.feed_name, item.link))
+                    removed += 1
+                elif exact:
+                    removed += 1
+                else:
+                    item.other_sources.append((primary.feed_name, primary.link))
+                    collapsed.setdefault(feed_name, []).append(item)
+        return collapsed, removed
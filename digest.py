@@ -0,0 +1,121 @@
+"""
+Digest mode.
+
+Guilds in digest mode get one summary post per interval instead of an embed
+per item. DigestWindow keeps the items fetched over the last day; a digest
+takes the items of one period, ranks them by how many outlets covered the
+story and how recent it is, and groups them by topic. Periods are aligned to
+the clock, so every guild with the same interval and filters shares the same
+digest and it is only built once.
+"""
+import re
+import time
+from collections import Counter, deque
+
+DEFAULT_TOPIC = "Otros"
+
+# Checked in order, the first topic with a matching word wins
+TOPICS = [
+    ("Nintendo", {"nintendo", "switch", "zelda", "mario", "pokemon", "pokémon", "metroid", "kirby", "splatoon"}),
+    ("PlayStation", {"playstation", "ps5", "ps4", "sony", "ps plus", "psvr", "psvr2"}),
+    ("Xbox", {"xbox", "game pass", "microsoft", "bethesda", "halo", "starfield"}),
+    ("PC", {"pc", "steam", "epic games store", "valve", "nvidia", "amd", "gog", "mod", "mods"}),
+    ("Móvil", {"mobile", "ios", "android", "iphone", "ipad", "apple arcade"}),
+    ("Industria", {
+        "layoffs", "acquisition", "acquires", "studio", "ceo", "lawsuit", "sales", "earnings", "union",
+        "esports", "tournament", "delay", "delayed"
+    }),
+]
+
+_WORD_RE = re.compile(r"[\w']+")
+
+def classify(text):
+    """Topic of an item from the words of its title and summary"""
+    words = _WORD_RE.findall(text.lower())
+    single = set(words)
+    padded = f" {' '.join(words)} "
+    for topic, keywords in TOPICS:
+        for keyword in keywords:
+            if (' ' in keyword and f" {keyword} " in padded) or keyword in single:
+                return topic
+    return DEFAULT_TOPIC
+
+class DigestWindow:
+    """
+    Items fetched over the last window seconds, in arrival order.
+
+    Args:
+        window: Seconds an item stays available for digests, at least the longest digest interval.
+    """
+    def __init__(self, window=24 * 3600):
+        self.window = window
+        self._items = deque()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _expire(self, now):
+        while self._items and self._items[0][0] < now - self.window:
+            self._items.popleft()
+
+    def add(self, items, now=None):
+        now = time.time() if now is None else now
+        for item in items:
+            self._items.append((now, item))
+        self._expire(now)
+
+    def between(self, start, end):
+        """(added_at, item) pairs that arrived in [start, end)"""
+        return [(added_at, item) for added_at, item in self._items if start <= added_at < end]
+
+    def export(self, to_record):
+        return [[added_at, to_record(item)] for added_at, item in self._items]
+
+    def restore(self, records, from_record):
+        now = time.time()
+        self._items = deque((added_at, from_record(record)) for added_at, record in records)
+        self._expire(now)
+
+def period_bounds(interval, now=None):
+    """Start and end of the last complete digest period of interval seconds, aligned to the clock"""
+    now = time.time() if now is None else now
+    end = now - now % interval
+    return end - interval, end
+
+def rank(entries, now=None, half_life=6 * 3600):
+    """
+    Order (added_at, item) pairs by importance.
+
+    A story covered by more outlets (collapsed into other_sources) ranks higher,
+    and the score halves every half_life seconds of age.
+    """
+    now = time.time() if now is None else now
+    def score(entry):
+        added_at, item = entry
+        return (1 + len(item.other_sources)) * 0.5 ** (max(0.0, now - added_at) / half_life)
+    return [item for _, item in sorted(entries, key=score, reverse=True)]
+
+def build_digest(entries, now=None, max_items=25, max_per_topic=6):
+    """
+    Rank and group items for a digest.
+
+    Returns:
+        dict: 'total' items in the period, 'sources' Counter of items per feed,
+              'sections' [(topic, [items])] with the best max_items items,
+              topics ordered by their best item.
+    """
+    ranked = rank(entries, now)
+    sections = {}
+    shown = 0
+    for item in ranked:
+        if shown >= max_items:
+            break
+        topic_items = sections.setdefault(classify(f"{item.title} {item.summary}"), [])
+        if len(topic_items) < max_per_topic:
+            topic_items.append(item)
+            shown += 1
+    return {
+        'total': len(ranked),
+        'sources': Counter(item.feed_name for item in ranked),
+        'sections': list(sections.items())
+    }
@@ -0,0 +1,162 @@
+"""
+Feed parsing helpers.
+
+This module only depends on feedparser and the standard library so it can be
+loaded cheaply by the parsing worker processes: parse_feed runs there and hands
+back compact entries instead of full feedparser results.
+"""
+import hashlib
+import html
+import logging
+import re
+
+import feedparser
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MAX_LENGTH = 300  # caracteres del resumen en cada embed
+
+# Tokens que clean_html trata: etiquetas, entidades y espacios en blanco
+_HTML_TOKEN_RE = re.compile(r'<[^>]+>|&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);|\s+')
+
+# Función para limpiar HTML
+def clean_html(text, max_length=None):
+    """
+    Elimina las etiquetas HTML del texto, decodifica las entidades y colapsa los espacios,
+    todo en una sola pasada.
+
+    Args:
+        text: Texto HTML a limpiar.
+        max_length: Si se indica, deja de procesar en cuanto hay más de max_length
+                    caracteres limpios, para no recorrer cuerpos HTML enormes.
+
+    Returns:
+        str: El texto limpio, con como mucho max_length + 1 caracteres si se indicó
+             max_length (así quien llama sabe si debe truncar).
+    """
+    limit = max_length + 1 if max_length is not None else None
+    parts = []
+    length = 0
+    pending_space = False
+    pos = 0
+
+    def emit(chunk):
+        """Añade texto a la salida, devuelve True cuando ya se alcanzó el límite"""
+        nonlocal length, pending_space
+        if pending_space:
+            parts.append(' ')
+            length += 1
+            pending_space = False
+        parts.append(chunk)
+        length += len(chunk)
+        return limit is not None and length >= limit
+
+    for match in _HTML_TOKEN_RE.finditer(text):
+        start = match.start()
+        if start > pos and emit(text[pos:start]):
+            break
+        pos = match.end()
+        token = match.group()
+
+        if token[0] == '<':
+            continue
+        if token[0] == '&':
+            decoded = html.unescape(token)
+            if not decoded.isspace():
+                if emit(decoded):
+                    break
+                continue
+        # Espacios en blanco: se colapsan en uno y nunca quedan al inicio ni al final
+        pending_space = length > 0
+    else:
+        if pos < len(text):
+            emit(text[pos:])
+
+    result = ''.join(parts)
+    return result[:limit] if limit is not None else result
+
+def truncate_summary(text, max_length=SUMMARY_MAX_LENGTH):
+    """Limpia un resumen HTML y lo recorta a max_length caracteres"""
+    summary = clean_html(text, max_length)
+    if len(summary) > max_length:
+        summary = summary[:max_length - 3] + "..."
+    return summary
+
+def extract_url(link):
+    """
+    Extrae la URL de diferentes formatos de enlaces que pueden venir en los feeds RSS.
+    
+    Args:
+        link: Puede ser una cadena de texto (URL directa), un diccionario con 'href',
+              o una lista de diccionarios con 'href'.
+    
+    Returns:
+        str: La URL extraída o '#' si no se encuentra ninguna URL válida.
+    """
+    if isinstance(link, str):
+        return link
+    elif isinstance(link, list) and link:
+        return extract_url(link[0])
+    elif isinstance(link, dict):
+        return link.get('href', '#')
+    return '#'
+
+def extract_image_url(entry):
+    """Find the thumbnail of a feedparser entry, None if it has no usable image"""
+    image_url = None
+    if 'media_thumbnail' in entry and entry['media_thumbnail']:
+        image_url = extract_url(entry['media_thumbnail'][0].get('url', ''))
+    elif 'media_content' in entry and entry['media_content']:
+        image_url = extract_url(entry['media_content'][0].get('url', ''))
+    elif entry.get('links'):
+        for link_item in entry['links']:
+            if isinstance(link_item, dict) and link_item.get('type', '').startswith('image/'):
+                image_url = extract_url(link_item)
+                break
+
+    if image_url and not (image_url.startswith('http://') or image_url.startswith('https://')):
+        image_url = None
+    return image_url
+
+def compact_entry(feed_name, entry):
+    """
+    Reduce a feedparser entry to the fields used to publish it.
+
+    Returns:
+        dict: id, title, link, published, summary (clean and truncated) and image_url.
+    """
+    raw_link = entry.get('link', '#')
+    # The ID falls back to the same hash NewsCache always used, so seen entries stay seen
+    entry_id = entry.get('id', '') or entry.get('guid', '') or hashlib.md5(
+        f"{entry.get('title', '')}{entry.get('published', '')}{raw_link}".encode()
+    ).hexdigest()
+
+    # Proceso del link
+    link = extract_url(raw_link)
+    # Remove UTM parameters
+    if '?' in link:
+        link = link.split('?')[0]
+
+    try:
+        image_url = extract_image_url(entry)
+    except Exception as e:
+        logger.error(f"Error processing image for {feed_name}: {str(e)}")
+        image_url = None
+
+    return {
+        'id': entry_id,
+        'title': entry.get('title', 'Sin título'),
+        'link': link,
+        'published': entry.get('published', 'Fecha no disponible'),
+        'summary': truncate_summary(entry.get('summary', '')),  # Limpia el HTML y recorta
+        'image_url': image_url
+    }
+
+def parse_feed(feed_name, body, response_headers, max_entries):
+    """
+    Parse a downloaded feed and return its newest entries in compact form.
+
+    Meant to run in a worker process: the full feedparser result never leaves it.
+    """
+    feed = feedparser.parse(body, response_headers=response_headers)
+    return [compact_entry(feed_name, entry) for entry in feed.entries[:max_entries]]
@@ -0,0 +1,31 @@
+"""
+Feed sources.
+
+The feeds the registry is seeded with and the User-Agent sent when fetching
+them. Kept apart from bot.py so tools such as the benchmarks can read them
+without loading the bot.
+"""
+
+USER_AGENT = "KaminariNewsBot/1.0 (+https://github.com/CMCFame/KaminariNewsBot)"
+
+# Updated Gaming RSS feeds list, seeds the feed registry on first start
+DEFAULT_FEEDS = {
+    "Destructoid": "https://www.destructoid.com/feed/",
+    "Xbox Wire": "https://news.xbox.com/en-us/feed/",
+    "Kotaku": "https://kotaku.com/rss",
+    "VG247": "https://www.vg247.com/feed/news",
+    "Touch Arcade": "https://toucharcade.com/feed/",
+    "GameSpot": "https://www.gamespot.com/feeds/mashup/",
+    "IGN": "http://feeds.feedburner.com/ign/news",
+    "Polygon": "https://www.polygon.com/rss/index.xml",
+    "DualShockers": "https://www.dualshockers.com/feed/",
+    "Gematsu": "https://www.gematsu.com/feed",
+    "PC Gamer": "https://www.pcgamer.com/rss/",
+    "Eurogamer": "https://www.eurogamer.net/feed",
+    "Twinfinite": "https://twinfinite.net/feed/",
+    "Push Square": "https://www.pushsquare.com/feeds/latest",
+    "Pocket Gamer": "https://pocket4957.rssing.com/chan-78169779/index-latest.php",
+    "Siliconera": "https://www.siliconera.com/feed/",
+    "Nintendo Everything": "https://nintendoeverything.com/feed/",
+    "VGC": "https://www.videogameschronicle.com/category/news/feed/"
+}
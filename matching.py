@@ -0,0 +1,158 @@
+"""
+Per-guild news filters.
+
+A fetched batch is matched once against the filters of every guild: all
+include/exclude keywords of all guilds live in a single Aho-Corasick automaton,
+so each item's text is scanned once no matter how many guilds have filters,
+and the matched keywords are turned into the set of guilds that get the item.
+"""
+from collections import deque
+
+class AhoCorasick:
+    """Multi-pattern matcher, finds every occurrence of a set of keywords in one pass over the text"""
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for pattern in patterns:
+            self._insert(pattern)
+        self._build()
+
+    def _insert(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = self._output[state] + (pattern,)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter(self, text):
+        """Yield (end_index, pattern) for every match, end_index being the last character"""
+        state = 0
+        goto = self._goto
+        fail = self._fail
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                yield index, pattern
+
+def normalize_keyword(keyword):
+    return ' '.join(keyword.lower().split())
+
+class FilterRouter:
+    """
+    Decides which guilds receive each item of a batch.
+
+    Filters are dicts with optional 'sources', 'include' and 'exclude' lists:
+    an item reaches a guild when its feed is one of the guild's sources (or the
+    guild chose none), it contains one of the include keywords (or there are
+    none) and it contains none of the exclude keywords. Keywords match whole
+    words of the title and summary, case-insensitively. A story collapsed from
+    several feeds counts as coming from each of them.
+    """
+    def __init__(self, filters=None):
+        self.update(filters or {})
+
+    def update(self, filters):
+        """Rebuild the shared matcher from {guild_id: filters}"""
+        self.filtered_guilds = set()
+        self.any_source = set()
+        self.by_source = {}
+        self.include_required = set()
+        self.include_guilds = {}
+        self.exclude_guilds = {}
+
+        for guild_id, guild_filters in filters.items():
+            sources = guild_filters.get('sources') or []
+            include = [normalize_keyword(k) for k in guild_filters.get('include') or [] if k.strip()]
+            exclude = [normalize_keyword(k) for k in guild_filters.get('exclude') or [] if k.strip()]
+            if not (sources or include or exclude):
+                continue
+
+            self.filtered_guilds.add(guild_id)
+            if sources:
+                for source in sources:
+                    self.by_source.setdefault(source, set()).add(guild_id)
+            else:
+                self.any_source.add(guild_id)
+            if include:
+                self.include_required.add(guild_id)
+            for keyword in include:
+                self.include_guilds.setdefault(keyword, set()).add(guild_id)
+            for keyword in exclude:
+                self.exclude_guilds.setdefault(keyword, set()).add(guild_id)
+
+        keywords = set(self.include_guilds) | set(self.exclude_guilds)
+        self.automaton = AhoCorasick(keywords) if keywords else None
+
+    def _matched_keywords(self, text):
+        if self.automaton is None:
+            return set()
+        text = ' '.join(text.lower().split())
+        matched = set()
+        for end, keyword in self.automaton.iter(text):
+            start = end - len(keyword) + 1
+            # Whole words only: "switch" must not match "switchback"
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end + 1 < len(text) and text[end + 1].isalnum():
+                continue
+            matched.add(keyword)
+        return matched
+
+    def guilds_for(self, feed_names, text):
+        """Return the filtered guilds that should receive an item published by any of feed_names"""
+        eligible = set(self.any_source)
+        for feed_name in feed_names:
+            eligible |= self.by_source.get(feed_name, set())
+        if not eligible:
+            return set()
+
+        included = set()
+        excluded = set()
+        for keyword in self._matched_keywords(text):
+            included |= self.include_guilds.get(keyword, set())
+            excluded |= self.exclude_guilds.get(keyword, set())
+        return eligible - excluded - (self.include_required - included)
+
+    def guilds_for_item(self, item):
+        """guilds_for an item, eligible through its own feed or the feeds collapsed into it"""
+        feed_names = {item.feed_name} | {feed_name for feed_name, _ in item.other_sources}
+        return self.guilds_for(feed_names, f"{item.title} {item.summary}")
+
+    def route(self, batch):
+        """
+        Split a batch ({feed_name: [items]}) for the guilds that have filters.
+
+        Returns:
+            dict: {guild_id: batch} for every filtered guild, guilds missing from
+                  it have no filters and get the whole batch.
+        """
+        routed = {guild_id: {} for guild_id in self.filtered_guilds}
+        if not routed:
+            return routed
+
+        for feed_name, items in batch.items():
+            for item in items:
+                for guild_id in self.guilds_for_item(item):
+                    routed[guild_id].setdefault(feed_name, []).append(item)
+        return routed
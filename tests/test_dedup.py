@@ -0,0 +1,70 @@
+import unittest
+from types import SimpleNamespace
+
+from dedup import StoryIndex, canonical_url, title_shingles
+
+def item(feed_name, title, link):
+    return SimpleNamespace(feed_name=feed_name, id=link, title=title, link=link, summary="", other_sources=[])
+
+class CanonicalUrlTest(unittest.TestCase):
+    def test_tracking_parameters_and_scheme_are_ignored(self):
+        self.assertEqual(
+            canonical_url("https://www.ign.com/articles/zelda/?utm_source=rss&page=2"),
+            canonical_url("http://ign.com/articles/zelda?page=2#comments")
+        )
+
+    def test_placeholder_links_have_no_canonical_form(self):
+        self.assertIsNone(canonical_url("#"))
+        self.assertIsNone(canonical_url(""))
+
+class TitleShinglesTest(unittest.TestCase):
+    def test_bigrams_without_stopwords(self):
+        self.assertEqual(title_shingles("The Legend of Zelda"), {"legend zelda"})
+
+class StoryIndexTest(unittest.TestCase):
+    def test_same_story_from_two_feeds_is_collapsed(self):
+        index = StoryIndex()
+        ign = item("IGN", "Nintendo Direct announced for tomorrow with Switch 2 games", "https://ign.com/a")
+        gamespot = item("GameSpot", "Nintendo Direct Announced For Tomorrow With Switch 2 Games", "https://gamespot.com/b")
+        batch, removed = index.collapse({"IGN": [ign], "GameSpot": [gamespot]})
+        self.assertEqual(batch, {"IGN": [ign]})
+        self.assertEqual(removed, 1)
+        self.assertEqual(ign.other_sources, [("GameSpot", "https://gamespot.com/b")])
+
+    def test_items_of_one_feed_are_never_merged(self):
+        index = StoryIndex()
+        review = item("IGN", "Pokemon Legends Z-A Review", "https://ign.com/review")
+        preview = item("IGN", "Pokemon Legends Z-A Preview", "https://ign.com/preview")
+        batch, removed = index.collapse({"IGN": [review, preview]})
+        self.assertEqual(batch, {"IGN": [review, preview]})
+        self.assertEqual(removed, 0)
+
+    def test_review_and_preview_from_different_feeds_are_different_stories(self):
+        index = StoryIndex()
+        batch, removed = index.collapse({
+            "IGN": [item("IGN", "Pokemon Legends Z-A Review", "https://ign.com/review")],
+            "GameSpot": [item("GameSpot", "Pokemon Legends Z-A Preview", "https://gamespot.com/preview")]
+        })
+        self.assertEqual(removed, 0)
+
+    def test_items_without_link_do_not_match_by_url(self):
+        index = StoryIndex()
+        first = item("IGN", "Halo", "#")
+        second = item("Kotaku", "Doom", "#")
+        batch, removed = index.collapse({"IGN": [first], "Kotaku": [second]})
+        self.assertEqual(removed, 0)
+
+    def test_earlier_batches(self):
+        index = StoryIndex()
+        index.collapse({"IGN": [item("IGN", "Hollow Knight Silksong release date revealed in new trailer", "https://ign.com/a")]})
+
+        same = item("Kotaku", "Hollow Knight Silksong release date revealed in new trailer", "https://kotaku.com/a")
+        similar = item("VG247", "Hollow Knight Silksong release date revealed in new trailer at last", "https://vg247.com/a")
+        batch, removed = index.collapse({"Kotaku": [same], "VG247": [similar]})
+        # The same headline was already delivered, a similar one is kept and points at it
+        self.assertEqual(removed, 1)
+        self.assertEqual(batch, {"VG247": [similar]})
+        self.assertEqual(similar.other_sources, [("IGN", "https://ign.com/a")])
+
+if __name__ == '__main__':
+    unittest.main()
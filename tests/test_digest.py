@@ -0,0 +1,61 @@
+import unittest
+from types import SimpleNamespace
+
+from digest import DEFAULT_TOPIC, DigestWindow, build_digest, classify, period_bounds
+
+def item(feed_name, title, other_sources=()):
+    return SimpleNamespace(feed_name=feed_name, title=title, summary="", other_sources=list(other_sources))
+
+class ClassifyTest(unittest.TestCase):
+    def test_first_matching_topic_wins(self):
+        self.assertEqual(classify("New Zelda coming to Switch and PC"), "Nintendo")
+
+    def test_multiword_keywords_match_whole_words(self):
+        self.assertEqual(classify("Five games leave Game Pass this month"), "Xbox")
+        self.assertEqual(classify("The endgame passes its first test"), DEFAULT_TOPIC)
+
+    def test_no_keyword_is_the_default_topic(self):
+        self.assertEqual(classify("A quiet week"), DEFAULT_TOPIC)
+
+class DigestWindowTest(unittest.TestCase):
+    def test_between_is_half_open(self):
+        window = DigestWindow()
+        first, second = item("IGN", "a"), item("IGN", "b")
+        window.add([first], now=100)
+        window.add([second], now=200)
+        self.assertEqual(window.between(100, 200), [(100, first)])
+
+    def test_old_items_expire(self):
+        window = DigestWindow(window=50)
+        window.add([item("IGN", "old")], now=100)
+        window.add([item("IGN", "new")], now=200)
+        self.assertEqual([entry.title for _, entry in window.between(0, 300)], ["new"])
+
+    def test_export_and_restore(self):
+        window = DigestWindow()
+        window.add([item("IGN", "a")])
+        restored = DigestWindow()
+        restored.restore(window.export(lambda entry: entry.title), lambda title: item("IGN", title))
+        self.assertEqual(len(restored), 1)
+
+class PeriodBoundsTest(unittest.TestCase):
+    def test_last_complete_period(self):
+        self.assertEqual(period_bounds(3600, now=3 * 3600 + 10), (2 * 3600, 3 * 3600))
+
+class BuildDigestTest(unittest.TestCase):
+    def test_wider_coverage_ranks_first(self):
+        single = item("IGN", "Small story")
+        covered = item("GameSpot", "Big story", [("IGN", "https://ign.com/a"), ("Polygon", "https://polygon.com/b")])
+        digest = build_digest([(1000, single), (900, covered)], now=1000)
+        self.assertEqual(digest['sections'][0][1][0], covered)
+
+    def test_limits_per_topic_and_total(self):
+        entries = [(1000, item("IGN", f"Zelda news {number}")) for number in range(5)]
+        entries += [(1000, item("IGN", f"Xbox news {number}")) for number in range(5)]
+        digest = build_digest(entries, now=1000, max_items=6, max_per_topic=3)
+        self.assertEqual(digest['total'], 10)
+        self.assertEqual(digest['sources'], {"IGN": 10})
+        self.assertEqual({topic: len(items) for topic, items in digest['sections']}, {"Nintendo": 3, "Xbox": 3})
+
+if __name__ == '__main__':
+    unittest.main()
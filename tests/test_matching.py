@@ -0,0 +1,46 @@
+import unittest
+from types import SimpleNamespace
+
+from dedup import StoryIndex
+from matching import AhoCorasick, FilterRouter
+
+def item(title, summary="", feed_name="IGN", link=""):
+    return SimpleNamespace(feed_name=feed_name, id=link, title=title, summary=summary, link=link, other_sources=[])
+
+class AhoCorasickTest(unittest.TestCase):
+    def test_overlapping_patterns(self):
+        matches = sorted(AhoCorasick(["he", "she", "hers"]).iter("ushers"))
+        self.assertEqual(matches, [(3, "he"), (3, "she"), (5, "hers")])
+
+class FilterRouterTest(unittest.TestCase):
+    def test_sources(self):
+        router = FilterRouter({1: {'sources': ["IGN"]}})
+        self.assertEqual(router.guilds_for(["IGN"], "anything"), {1})
+        self.assertEqual(router.guilds_for(["Kotaku"], "anything"), set())
+
+    def test_include_and_exclude(self):
+        router = FilterRouter({1: {'include': ["Zelda"], 'exclude': ["rumor"]}})
+        self.assertEqual(router.guilds_for(["IGN"], "New Zelda trailer"), {1})
+        self.assertEqual(router.guilds_for(["IGN"], "Zelda rumor debunked"), set())
+        self.assertEqual(router.guilds_for(["IGN"], "New Mario trailer"), set())
+
+    def test_keywords_match_whole_words_only(self):
+        router = FilterRouter({1: {'include': ["switch", "game pass"]}})
+        self.assertEqual(router.guilds_for(["IGN"], "Switchback VR review"), set())
+        self.assertEqual(router.guilds_for(["IGN"], "Coming to Switch."), {1})
+        self.assertEqual(router.guilds_for(["IGN"], "Leaving  Game\nPass soon"), {1})
+
+    def test_guilds_without_filters_are_not_routed(self):
+        router = FilterRouter({1: {'include': ["xbox"]}, 2: {'include': [" "]}, 3: {}})
+        zelda, xbox = item("Zelda news"), item("Xbox news")
+        self.assertEqual(router.route({"IGN": [zelda, xbox]}), {1: {"IGN": [xbox]}})
+
+    def test_collapsed_sources_are_eligible(self):
+        ign = item("Nintendo Direct announced for tomorrow", link="https://ign.com/a")
+        push_square = item("Nintendo Direct announced for tomorrow", feed_name="Push Square", link="https://pushsquare.com/b")
+        collapsed, _ = StoryIndex().collapse({"IGN": [ign], "Push Square": [push_square]})
+        router = FilterRouter({1: {'sources': ["Push Square"]}, 2: {'sources': ["Kotaku"]}})
+        self.assertEqual(router.route(collapsed), {1: {"IGN": [ign]}, 2: {}})
+
+if __name__ == '__main__':
+    unittest.main()